@@ -0,0 +1,235 @@
+"""
+压缩包处理模块
+Archive Processor Module
+
+直接在 zip / tar 压缩包内处理成员文件：按需把成员读入内存交给处理函数，结果写入新的压缩包，
+完成后原子地替换原压缩包，不需要先解压到磁盘。
+zip 中未修改的成员按原始压缩数据逐字节复制，不解压也不重新压缩；
+tar 成员本身不压缩，未修改的成员直接复制（.tar.gz 等整体压缩的格式仍需整体重新压缩）。
+"""
+
+import copy
+import io
+import os
+import struct
+import tarfile
+import time
+import zipfile
+
+# 压缩包扩展名与 tarfile 的压缩方式
+TAR_SUFFIXES = {
+    '.tar': '',
+    '.tar.gz': 'gz',
+    '.tgz': 'gz',
+    '.tar.bz2': 'bz2',
+    '.tbz2': 'bz2',
+    '.tar.xz': 'xz',
+    '.txz': 'xz',
+}
+
+_CHUNK_SIZE = 1024 * 1024
+
+# zip 本地文件头: 签名、版本、标志、压缩方式、时间、日期、CRC、压缩后大小、原始大小、文件名长度、扩展字段长度
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+_FLAG_DATA_DESCRIPTOR = 0x08
+_ZIP64_EXTRA_ID = 0x0001
+
+
+def archive_type(path):
+    """
+    判断压缩包类型
+
+    Returns:
+        tuple: ('zip', None) 或 ('tar', 压缩方式)
+    """
+    name = os.path.basename(path).lower()
+    if name.endswith('.zip'):
+        return 'zip', None
+    for suffix, compression in TAR_SUFFIXES.items():
+        if name.endswith(suffix):
+            return 'tar', compression
+    raise Exception(f"不支持的压缩包格式: {path}")
+
+
+def _strip_zip64(extra):
+    """去掉扩展字段中的 zip64 记录（写入时由 zipfile 按实际大小重新生成）"""
+    kept = []
+    pos = 0
+    while pos + 4 <= len(extra):
+        field_id, size = struct.unpack_from('<HH', extra, pos)
+        if field_id != _ZIP64_EXTRA_ID:
+            kept.append(extra[pos:pos + 4 + size])
+        pos += 4 + size
+    return b''.join(kept)
+
+
+def _copy_zip_member(src_file, info, dst):
+    """把 zip 成员的原始压缩数据复制到目标压缩包，不解压"""
+    src_file.seek(info.header_offset)
+    header = src_file.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size or header[:4] != _LOCAL_SIGNATURE:
+        raise Exception(f"成员 {info.filename} 的本地文件头损坏")
+    fields = _LOCAL_HEADER.unpack(header)
+    src_file.seek(fields[-2] + fields[-1], os.SEEK_CUR)
+
+    zinfo = copy.copy(info)
+    zinfo.extra = _strip_zip64(info.extra)
+    dst.fp.seek(dst.start_dir)
+    zinfo.header_offset = dst.fp.tell()
+    dst.fp.write(zinfo.FileHeader())
+
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = src_file.read(min(_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise Exception(f"成员 {info.filename} 的数据不完整")
+        dst.fp.write(chunk)
+        remaining -= len(chunk)
+
+    # 使用数据描述符的成员（加密成员的校验字节依赖该标志）保留标志，并在数据后写出描述符
+    if info.flag_bits & _FLAG_DATA_DESCRIPTOR:
+        if info.compress_size > zipfile.ZIP64_LIMIT or info.file_size > zipfile.ZIP64_LIMIT:
+            fmt = '<4sLQQ'
+        else:
+            fmt = '<4sLLL'
+        dst.fp.write(struct.pack(fmt, _DESCRIPTOR_SIGNATURE, info.CRC,
+                                 info.compress_size, info.file_size))
+
+    dst.start_dir = dst.fp.tell()
+    dst.filelist.append(zinfo)
+    dst.NameToInfo[zinfo.filename] = zinfo
+    dst._didModify = True
+
+
+def _plan_members(names, plan):
+    """
+    对每个成员调用 plan，返回 (处理计划, 被转换结果覆盖的成员名集合)
+
+    与处理散落文件时一致，转换输出的文件名若已存在，原有的同名成员被新结果替换。
+    """
+    plans = {}
+    for name in names:
+        planned = plan(name)
+        if planned is not None:
+            plans[name] = planned
+    superseded = {new_name for name, (new_name, _) in plans.items() if new_name != name}
+    return plans, superseded
+
+
+def _new_stats():
+    return {'members': 0, 'changed': 0, 'added': 0, 'copied': 0, 'removed': 0}
+
+
+def _rewrite_zip(archive_path, f, plan):
+    stats = _new_stats()
+    with zipfile.ZipFile(archive_path, 'r') as src, open(archive_path, 'rb') as src_file, \
+            zipfile.ZipFile(f, 'w') as dst:
+        infos = src.infolist()
+        plans, superseded = _plan_members(
+            [info.filename for info in infos if not info.is_dir()], plan)
+        now = time.localtime()[:6]
+
+        for info in infos:
+            stats['members'] += 1
+            name = info.filename
+            if name in superseded and name not in plans:
+                stats['removed'] += 1
+                continue
+            new_name, transform = plans.get(name, (None, None))
+            data = transform(src.read(info)) if transform else None
+            if data is None or new_name != name:
+                _copy_zip_member(src_file, info, dst)
+                stats['copied'] += 1
+            if data is None:
+                continue
+
+            # 原位修改的成员保留原有的时间和属性；转换生成的新成员使用当前时间
+            zinfo = zipfile.ZipInfo(new_name, date_time=info.date_time if new_name == name else now)
+            zinfo.create_system = info.create_system
+            zinfo.external_attr = info.external_attr
+            zinfo.compress_type = info.compress_type
+            dst.writestr(zinfo, data)
+            stats['changed' if new_name == name else 'added'] += 1
+
+        dst.comment = src.comment
+    return stats
+
+
+def _rewrite_tar(archive_path, f, plan, compression):
+    stats = _new_stats()
+    with tarfile.open(archive_path, 'r:' + compression) as src:
+        members = src.getmembers()
+        plans, superseded = _plan_members([m.name for m in members if m.isfile()], plan)
+        with tarfile.open(fileobj=f, mode='w:' + compression, format=src.format,
+                          encoding=src.encoding) as dst:
+            for member in members:
+                stats['members'] += 1
+                name = member.name
+                if name in superseded and name not in plans:
+                    stats['removed'] += 1
+                    continue
+                new_name, transform = plans.get(name, (None, None))
+                raw = data = None
+                if transform:
+                    # 每个成员只读取一次：整体压缩的 tar 向回定位需要从头重新解压
+                    with src.extractfile(member) as member_file:
+                        raw = member_file.read()
+                    data = transform(raw)
+                if data is None or new_name != name:
+                    if raw is not None:
+                        dst.addfile(member, io.BytesIO(raw))
+                    else:
+                        dst.addfile(member, src.extractfile(member) if member.isfile() else None)
+                    stats['copied'] += 1
+                if data is None:
+                    continue
+
+                info = copy.copy(member)
+                info.name = new_name
+                info.size = len(data)
+                info.pax_headers = {key: value for key, value in member.pax_headers.items()
+                                    if key not in ('path', 'size')}
+                if new_name != name:
+                    info.mtime = time.time()
+                dst.addfile(info, io.BytesIO(data))
+                stats['changed' if new_name == name else 'added'] += 1
+    return stats
+
+
+class _Unchanged(Exception):
+    """没有成员被修改时放弃写入"""
+
+    def __init__(self, stats):
+        super().__init__()
+        self.stats = stats
+
+
+def rewrite_archive(archive_path, writer, plan):
+    """
+    逐个处理压缩包中的成员，把结果写入新的压缩包并原子地替换原文件
+
+    Args:
+        archive_path: zip 或 tar（可为 .tar.gz / .tar.bz2 / .tar.xz）压缩包路径
+        writer: AtomicWriter，用于写入并替换压缩包
+        plan: 函数 plan(成员名)，不处理该成员时返回 None，否则返回 (输出成员名, transform)；
+            transform(成员内容 bytes) 返回新内容，内容不变时返回 None。
+            输出成员名与原名相同时原位修改，不同时新成员加在原成员之后（原成员保留）
+
+    Returns:
+        dict: members（成员总数）、changed（原位修改）、added（新增）、copied（原样复制）、
+            removed（被同名转换结果替换）；没有成员变化时不写入，原压缩包保持不变
+    """
+    kind, compression = archive_type(archive_path)
+    try:
+        with writer.open(archive_path, 'wb') as f:
+            if kind == 'zip':
+                stats = _rewrite_zip(archive_path, f, plan)
+            else:
+                stats = _rewrite_tar(archive_path, f, plan, compression)
+            if not stats['changed'] and not stats['added']:
+                raise _Unchanged(stats)
+    except _Unchanged as e:
+        return e.stats
+    return stats
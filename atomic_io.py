@@ -0,0 +1,195 @@
+"""
+原子写入模块
+Atomic Write Module
+
+所有写文件操作先写入同目录下的临时文件，完成后再通过重命名替换目标文件，
+写入中途崩溃或磁盘写满时原文件保持不变。支持逐文件 fsync、批量 fsync 或不 fsync，
+并保留原文件的权限、属主和（可选的）时间戳。
+"""
+
+import contextlib
+import os
+import stat
+import tempfile
+
+from metrics import NULL_METRICS
+
+# fsync 策略: file=每个文件写完立即落盘; batch=整批写完后统一落盘再替换; none=不调用fsync
+FSYNC_MODES = ('file', 'batch', 'none')
+
+
+def _current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _current_umask()
+
+
+def is_temp_path(path):
+    """判断路径是否为原子写入产生的临时文件"""
+    name = os.path.basename(path)
+    return name.startswith('.') and name.endswith('.tmp')
+
+
+def fsync_directory(dir_path):
+    """对目录执行 fsync，确保重命名操作落盘（Windows 上不支持，直接跳过）"""
+    if os.name == 'nt':
+        return
+    fd = os.open(dir_path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class AtomicWriter:
+    """
+    原子写入器
+
+    用法:
+        with AtomicWriter(fsync='batch') as writer:
+            for path in paths:
+                with writer.open(path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+
+    fsync='batch' 时，所有文件写完后才统一 fsync 并替换目标文件；
+    退出 with 块时已写完的文件总会被提交，即使随后发生了异常。
+    """
+
+    def __init__(self, fsync='file', preserve_times=True, metrics=None):
+        """
+        Args:
+            fsync: fsync 策略，见 FSYNC_MODES
+            preserve_times: 覆盖已有文件时是否保留其访问/修改时间
+            metrics: 可选的指标采集器，用于记录 fsync 阶段耗时
+        """
+        if fsync not in FSYNC_MODES:
+            raise Exception(f"不支持的fsync策略: {fsync}")
+        self.fsync = fsync
+        self.preserve_times = preserve_times
+        self.metrics = metrics or NULL_METRICS
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.commit()
+        return False
+
+    @contextlib.contextmanager
+    def open(self, path, mode='wb', encoding=None, newline=None, preserve_times=None):
+        """
+        打开目标文件对应的临时文件用于写入
+
+        Args:
+            path: 目标文件路径
+            mode: 写入模式，'wb' 或 'w'
+            encoding: 文本模式下的编码
+            newline: 文本模式下的换行处理，同内置 open()
+            preserve_times: 覆盖已有文件时是否保留时间戳，默认使用构造参数
+
+        Yields:
+            file: 临时文件对象
+        """
+        if 'w' not in mode:
+            raise Exception(f"原子写入仅支持写模式: {mode}")
+        if preserve_times is None:
+            preserve_times = self.preserve_times
+
+        # 目标为符号链接时写入链接指向的文件（与直接 open() 写入一致），而不是把链接替换为普通文件
+        path = os.path.realpath(os.fspath(path))
+        dir_name = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=dir_name)
+        try:
+            with open(fd, mode, encoding=encoding, newline=newline) as f:
+                yield f
+                f.flush()
+                if self.fsync == 'file':
+                    with self.metrics.phase('fsync'):
+                        os.fsync(f.fileno())
+            self._copy_metadata(path, tmp_path, preserve_times)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+        if self.fsync == 'batch':
+            self._pending.append((tmp_path, path))
+        else:
+            self._replace(tmp_path, path)
+            if self.fsync == 'file':
+                with self.metrics.phase('fsync'):
+                    fsync_directory(dir_name)
+
+    def write_bytes(self, path, data, preserve_times=None):
+        """原子地写入二进制内容"""
+        with self.open(path, 'wb', preserve_times=preserve_times) as f:
+            f.write(data)
+
+    @staticmethod
+    def _copy_metadata(path, tmp_path, preserve_times):
+        """把目标文件（若已存在）的权限、属主和时间戳复制到临时文件"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            # 新文件使用与 open() 相同的默认权限，而不是 mkstemp 的 0600
+            os.chmod(tmp_path, 0o666 & ~_UMASK)
+            return
+
+        os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+        if hasattr(os, 'chown'):
+            tmp_st = os.stat(tmp_path)
+            if (tmp_st.st_uid, tmp_st.st_gid) != (st.st_uid, st.st_gid):
+                with contextlib.suppress(OSError):
+                    os.chown(tmp_path, st.st_uid, st.st_gid)
+        if preserve_times:
+            os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    @staticmethod
+    def _replace(tmp_path, path):
+        try:
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    def commit(self):
+        """批量模式下统一 fsync 并替换所有已写完的文件"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        with self.metrics.phase('fsync'):
+            for tmp_path, _ in pending:
+                fd = os.open(tmp_path, os.O_RDWR)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+        dirs = set()
+        try:
+            for i, (tmp_path, path) in enumerate(pending):
+                self._replace(tmp_path, path)
+                dirs.add(os.path.dirname(os.path.abspath(path)))
+        except BaseException:
+            for tmp_path, _ in pending[i + 1:]:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+            raise
+        finally:
+            with self.metrics.phase('fsync'):
+                for dir_name in dirs:
+                    fsync_directory(dir_name)
+
+    def abort(self):
+        """丢弃所有尚未提交的临时文件"""
+        pending, self._pending = self._pending, []
+        for tmp_path, _ in pending:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+"""
+性能基准测试模块
+Benchmark Suite Module
+
+在本地生成合成语料（大量小文本、大文本、多尺寸图片、宽表/长表CSV、深层目录树），
+对 FileProcessor 的各项操作以及界面的扫描流程在不同并发设置下计时，
+记录吞吐量与单个用例的内存增长，并可与保存的基线结果对比、按阈值判定性能回退。
+
+用法示例:
+    python benchmark.py --scale small --workers 1,4 --save-baseline baseline.json
+    python benchmark.py --scale small --workers 1,4 --compare baseline.json --threshold 0.15
+"""
+
+import argparse
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic_io import FSYNC_MODES
+from file_processor import FileProcessor
+from table_io import has_pyarrow
+from trigram_index import TrigramIndex
+
+# 语料规模配置
+CORPUS_SCALES = {
+    'tiny': {
+        'small_text_count': 50, 'small_text_kb': 2,
+        'large_text_count': 1, 'large_text_mb': 1,
+        'image_count': 6, 'image_sizes': [(64, 64), (320, 240), (800, 600)],
+        'csv_wide': (200, 50), 'csv_tall': (5000, 6),
+        'tree_depth': 4, 'tree_fanout': 2, 'tree_files_per_dir': 3,
+    },
+    'small': {
+        'small_text_count': 1000, 'small_text_kb': 4,
+        'large_text_count': 2, 'large_text_mb': 8,
+        'image_count': 24, 'image_sizes': [(64, 64), (640, 480), (1920, 1080)],
+        'csv_wide': (1000, 200), 'csv_tall': (100000, 8),
+        'tree_depth': 6, 'tree_fanout': 2, 'tree_files_per_dir': 5,
+    },
+    'medium': {
+        'small_text_count': 10000, 'small_text_kb': 4,
+        'large_text_count': 4, 'large_text_mb': 64,
+        'image_count': 100, 'image_sizes': [(64, 64), (640, 480), (1920, 1080), (4000, 3000)],
+        'csv_wide': (5000, 500), 'csv_tall': (1000000, 8),
+        'tree_depth': 8, 'tree_fanout': 2, 'tree_files_per_dir': 10,
+    },
+}
+
+# 生成文本内容使用的词表
+WORDS = [
+    'lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit',
+    'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore',
+    'magna', 'aliqua', '文件', '处理', '批量', '测试', '数据',
+]
+
+# 整理操作使用的混合扩展名
+MIXED_EXTENSIONS = ['.txt', '.md', '.jpg', '.png', '.csv', '.mp3', '.zip', '.py', '.json', '.bin']
+
+
+def _random_text(rng, size_bytes):
+    """生成约 size_bytes 字节的随机文本"""
+    parts = []
+    total = 0
+    while total < size_bytes:
+        line = ' '.join(rng.choice(WORDS) for _ in range(12)) + '\n'
+        parts.append(line)
+        total += len(line.encode('utf-8'))
+    return ''.join(parts)
+
+
+class CorpusGenerator:
+    """合成语料生成器"""
+
+    def __init__(self, root, scale='small', seed=42):
+        if scale not in CORPUS_SCALES:
+            raise Exception(f"未知的语料规模: {scale}")
+        self.root = root
+        self.config = CORPUS_SCALES[scale]
+        self.rng = random.Random(seed)
+
+    def _make_dir(self, name):
+        path = os.path.join(self.root, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def small_texts(self):
+        """生成大量小文本文件"""
+        folder = self._make_dir('small_text')
+        size = self.config['small_text_kb'] * 1024
+        paths = []
+        for i in range(self.config['small_text_count']):
+            path = os.path.join(folder, f"small_{i:06d}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(_random_text(self.rng, size))
+            paths.append(path)
+        return paths
+
+    def large_texts(self):
+        """生成大文本文件"""
+        folder = self._make_dir('large_text')
+        # 先生成一个1MB的块再重复写入，避免生成过程本身过慢
+        block = _random_text(self.rng, 1024 * 1024)
+        paths = []
+        for i in range(self.config['large_text_count']):
+            path = os.path.join(folder, f"large_{i:03d}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                for _ in range(self.config['large_text_mb']):
+                    f.write(block)
+            paths.append(path)
+        return paths
+
+    def images(self):
+        """生成多种尺寸的PNG图片"""
+        from PIL import Image
+
+        folder = self._make_dir('images')
+        sizes = self.config['image_sizes']
+        paths = []
+        for i in range(self.config['image_count']):
+            size = sizes[i % len(sizes)]
+            img = Image.merge('RGB', (
+                Image.linear_gradient('L').resize(size),
+                Image.radial_gradient('L').resize(size),
+                Image.effect_noise(size, 32),
+            ))
+            path = os.path.join(folder, f"image_{i:04d}_{size[0]}x{size[1]}.png")
+            img.save(path, format='PNG')
+            paths.append(path)
+        return paths
+
+    def _write_csv(self, path, rows, cols):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([f"col_{c}" for c in range(cols)])
+            for r in range(rows):
+                writer.writerow([
+                    self.rng.randint(0, 1000000) if c % 3 else f"{self.rng.choice(WORDS)}_{r}"
+                    for c in range(cols)
+                ])
+
+    def csvs(self):
+        """生成宽表和长表CSV"""
+        folder = self._make_dir('csv')
+        wide = os.path.join(folder, 'wide.csv')
+        tall = os.path.join(folder, 'tall.csv')
+        self._write_csv(wide, *self.config['csv_wide'])
+        self._write_csv(tall, *self.config['csv_tall'])
+        return {'wide': wide, 'tall': tall}
+
+    def deep_tree(self):
+        """生成深层目录树"""
+        root = self._make_dir('deep_tree')
+        depth = self.config['tree_depth']
+        fanout = self.config['tree_fanout']
+        per_dir = self.config['tree_files_per_dir']
+
+        def build(folder, level):
+            for i in range(per_dir):
+                with open(os.path.join(folder, f"node_{level}_{i}.txt"), 'w', encoding='utf-8') as f:
+                    f.write(_random_text(self.rng, 1024))
+            if level < depth:
+                for j in range(fanout):
+                    child = os.path.join(folder, f"d{j}")
+                    os.makedirs(child, exist_ok=True)
+                    build(child, level + 1)
+
+        build(root, 1)
+        return root
+
+    def mixed_folder(self):
+        """生成包含多种扩展名的平铺文件夹（用于整理操作）"""
+        folder = self._make_dir('mixed')
+        for i in range(self.config['small_text_count']):
+            ext = MIXED_EXTENSIONS[i % len(MIXED_EXTENSIONS)]
+            with open(os.path.join(folder, f"mixed_{i:06d}{ext}"), 'wb') as f:
+                f.write(b'x' * self.rng.randint(16, 4096))
+        return folder
+
+
+class PeakRSSMonitor:
+    """
+    后台采样进程常驻内存(RSS)，记录峰值
+
+    所有用例在同一进程中依次运行，进程的 RSS 会随之累积，因此同时记录进入时的 RSS，
+    用峰值减去它（growth）衡量单个用例自身的内存占用。
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = None
+        self.start = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._reader = self._choose_reader()
+
+    @staticmethod
+    def _choose_reader():
+        try:
+            import psutil
+            process = psutil.Process()
+            return lambda: process.memory_info().rss
+        except ImportError:
+            pass
+        if os.path.exists('/proc/self/statm'):
+            page_size = os.sysconf('SC_PAGE_SIZE')
+
+            def read_statm():
+                with open('/proc/self/statm') as f:
+                    return int(f.read().split()[1]) * page_size
+            return read_statm
+        return None
+
+    def _sample(self):
+        rss = self._reader()
+        if self.peak is None or rss > self.peak:
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    @property
+    def growth(self):
+        """用例运行期间 RSS 峰值相对开始时的增长，无法实时采样时为 None"""
+        if self.peak is None or self.start is None:
+            return None
+        return max(0, self.peak - self.start)
+
+    def __enter__(self):
+        if self._reader:
+            self.start = self._reader()
+            self._sample()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+        else:
+            # 无法实时采样时退回到进程生命周期内的最大RSS
+            try:
+                import resource
+                maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                # Linux 单位为KB，macOS 单位为字节
+                self.peak = maxrss if sys.platform == 'darwin' else maxrss * 1024
+            except ImportError:
+                self.peak = None
+        return False
+
+
+class _ImmediateRoot:
+    """模拟 Tk 根窗口的 after()，立即执行回调"""
+
+    def after(self, delay, callback=None, *args):
+        if callback:
+            callback(*args)
+
+
+class _HeadlessScanner:
+    """无界面运行 FileProcessorGUI 扫描流程所需的最小替身"""
+
+    def __init__(self, gui_class):
+        self.root = _ImmediateRoot()
+        self.processor = FileProcessor()
+        self.current_files = None
+        self._gui_class = gui_class
+
+    def format_file_size(self, size_bytes):
+        return self._gui_class.format_file_size(self, size_bytes)
+
+    def format_timestamp(self, timestamp):
+        return self._gui_class.format_timestamp(self, timestamp)
+
+    def _update_file_list(self):
+        pass
+
+    def log_message(self, message):
+        pass
+
+    def scan(self, folder):
+        self._gui_class._scan_files_thread(self, folder)
+        return len(self.current_files)
+
+
+def _split(items, parts):
+    """把列表尽量均匀地切分为 parts 份"""
+    parts = max(1, min(parts, len(items)))
+    return [items[i::parts] for i in range(parts)]
+
+
+def _total_size(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+
+def _walk_files(folder):
+    result = []
+    for dir_path, _, file_names in os.walk(folder):
+        for name in file_names:
+            result.append(os.path.join(dir_path, name))
+    return result
+
+
+class BenchmarkSuite:
+    """基准测试套件"""
+
+    def __init__(self, work_dir, scale='small', workers=(1,), repeat=3, seed=42, fsync='file'):
+        self.work_dir = work_dir
+        self.scale = scale
+        self.workers = list(workers)
+        self.repeat = repeat
+        self.processor = FileProcessor(fsync=fsync)
+        self.generator = CorpusGenerator(os.path.join(work_dir, 'corpus'), scale, seed)
+        self.corpus = {}
+
+    def prepare(self):
+        """生成语料（不计入计时）"""
+        gen = self.generator
+        self.corpus['small_text'] = gen.small_texts()
+        self.corpus['large_text'] = gen.large_texts()
+        self.corpus['csv'] = gen.csvs()
+        self.corpus['deep_tree'] = gen.deep_tree()
+        self.corpus['mixed'] = gen.mixed_folder()
+        try:
+            self.corpus['images'] = gen.images()
+        except ImportError:
+            self.corpus['images'] = []
+
+        # Excel 输入由 CSV 转换得到，放在单独目录避免覆盖原始CSV
+        excel_dir = os.path.join(self.work_dir, 'corpus', 'excel')
+        os.makedirs(excel_dir, exist_ok=True)
+        sources = []
+        for name, path in self.corpus['csv'].items():
+            target = os.path.join(excel_dir, f"{name}.csv")
+            shutil.copy2(path, target)
+            sources.append(target)
+        self.processor.csv_to_excel(sources)
+        self.corpus['excel'] = [os.path.splitext(p)[0] + '.xlsx' for p in sources]
+
+    def _parallel(self, func, items, workers):
+        """把输入切片后用线程池并发调用 func"""
+        chunks = _split(items, workers)
+        if len(chunks) == 1:
+            return func(chunks[0])
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            return sum(executor.map(func, chunks))
+
+    def cases(self):
+        """
+        返回测试用例列表
+
+        每个用例为 (名称, 是否支持并发, setup, run)：setup 返回 (输入, 输入字节数)，
+        run(输入, 并发数) 返回处理的文件数量。
+        """
+        p = self.processor
+        corpus = self.corpus
+
+        def files_setup(key):
+            return lambda: (corpus[key], _total_size(corpus[key]))
+
+        def fresh_setup(key):
+            # 会修改文件的用例每次都使用语料的新副本，保证每轮都真正写入
+            def setup():
+                source = corpus[key]
+                target = os.path.join(self.work_dir, 'run', key)
+                if os.path.exists(target):
+                    shutil.rmtree(target)
+                if isinstance(source, str):
+                    shutil.copytree(source, target)
+                    return target, _total_size(_walk_files(target))
+                os.makedirs(target)
+                paths = [shutil.copy(path, target) for path in source]
+                return paths, _total_size(paths)
+            return setup
+
+        def replace_run(find_text, replace_text, case_sensitive=True, use_regex=False, encoding='utf-8'):
+            return lambda items, workers: self._parallel(
+                lambda chunk: p.batch_text_replace(chunk, find_text, replace_text, encoding,
+                                                   case_sensitive, use_regex),
+                items, workers)
+
+        def rules_run(items, workers):
+            # 每个词对应一条规则，另加同样数量不会命中的规则
+            pairs = [(w, w.upper() + '_') for w in WORDS] + [(f"{w}_missing", w) for w in WORDS]
+            return self._parallel(
+                lambda chunk: p.batch_text_replace_rules(chunk, pairs, 'utf-8')['files_processed'],
+                items, workers)
+
+        def preview_run(items, workers):
+            return sum(1 for _ in p.preview_text_replace(items, 'lorem', 'ipsum', max_workers=workers))
+
+        def indexed_setup():
+            folder = os.path.dirname(corpus['small_text'][0])
+            index = TrigramIndex(folder, os.path.join(self.work_dir, 'trigram.sqlite'))
+            index.refresh()
+            index.close()
+            return corpus['small_text'], _total_size(corpus['small_text'])
+
+        def indexed_run(items, workers):
+            folder = os.path.dirname(items[0])
+            with TrigramIndex(folder, os.path.join(self.work_dir, 'trigram.sqlite')) as index:
+                return p.batch_text_replace(items, 'rare_token', 'x', 'utf-8', True, index=index)
+
+        def deep_tree_run(items, workers):
+            files = _walk_files(items)
+            return self._parallel(
+                lambda chunk: p.batch_text_replace(chunk, 'lorem', 'merol', 'utf-8', True, False),
+                files, workers)
+
+        def organize_setup():
+            # 整理会移动文件，每次都复制一份新的目录
+            target = os.path.join(self.work_dir, 'organize_run')
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            shutil.copytree(corpus['mixed'], target)
+            return target, _total_size(_walk_files(target))
+
+        def organize_run(folder, workers):
+            return p.organize_files_by_type(folder)['files_moved']
+
+        def scan_setup():
+            # 导入 gui_interface（及 tkinter）放在计时之外
+            from gui_interface import FileProcessorGUI
+            return (os.path.dirname(corpus['small_text'][0]), FileProcessorGUI), 0
+
+        def scan_run(items, workers):
+            folder, gui_class = items
+            # 多个扫描同时进行（如连续切换文件夹时后台仍有扫描线程未结束）
+            if workers == 1:
+                return _HeadlessScanner(gui_class).scan(folder)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return sum(executor.map(lambda _: _HeadlessScanner(gui_class).scan(folder),
+                                        range(workers)))
+
+        def duplicates_run(items, workers):
+            p.find_duplicate_files(items, workers)
+            return len(items)
+
+        def archive_setup():
+            # 压缩包会被原地改写，每次都重新打包一份
+            path = os.path.join(self.work_dir, 'small_text.zip')
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for file_path in corpus['small_text']:
+                    archive.write(file_path, os.path.basename(file_path))
+            return [path], _total_size([path])
+
+        def archive_replace_run(items, workers):
+            result = p.archive_text_replace(items, 'lorem', 'merol', 'utf-8', True)
+            return result['changed'] + result['copied']
+
+        def file_info_run(items, workers):
+            return self._parallel(lambda chunk: len([p.get_file_info(f) for f in chunk]), items, workers)
+
+        cases = [
+            ('text_replace_small_files', True, fresh_setup('small_text'), replace_run('lorem', 'merol')),
+            ('text_replace_large_files', True, fresh_setup('large_text'), replace_run('lorem', 'merol')),
+            ('text_replace_auto_encoding', True, fresh_setup('small_text'),
+             replace_run('lorem', 'merol', encoding='auto')),
+            ('text_replace_regex_large', True, fresh_setup('large_text'),
+             replace_run(r'\bipsum\b', 'muspi', use_regex=True)),
+            ('text_replace_ignore_case', True, fresh_setup('small_text'),
+             replace_run('LOREM', 'merol', case_sensitive=False)),
+            ('text_rules_single_pass', True, fresh_setup('small_text'), rules_run),
+            ('text_preview_small_files', True, files_setup('small_text'), preview_run),
+            ('text_preview_large_files', True, files_setup('large_text'), preview_run),
+            ('text_replace_indexed_rare', False, indexed_setup, indexed_run),
+            ('text_replace_deep_tree', True, fresh_setup('deep_tree'), deep_tree_run),
+            ('csv_to_excel_wide', False,
+             lambda: ([corpus['csv']['wide']], _total_size([corpus['csv']['wide']])),
+             lambda items, workers: p.csv_to_excel(items)),
+            ('csv_to_excel_tall', False,
+             lambda: ([corpus['csv']['tall']], _total_size([corpus['csv']['tall']])),
+             lambda items, workers: p.csv_to_excel(items)),
+            ('csv_to_excel_tall_pandas', False,
+             lambda: ([corpus['csv']['tall']], _total_size([corpus['csv']['tall']])),
+             lambda items, workers: p.csv_to_excel(items, 'pandas')),
+            ('excel_to_csv', True, files_setup('excel'),
+             lambda items, workers: self._parallel(p.excel_to_csv, items, workers)),
+            ('organize_by_type', False, organize_setup, organize_run),
+            ('get_file_info', True, files_setup('small_text'), file_info_run),
+            ('find_duplicate_files', True, files_setup('small_text'), duplicates_run),
+            ('archive_text_replace', False, archive_setup, archive_replace_run),
+            ('gui_scan', True, scan_setup, scan_run),
+        ]
+        if has_pyarrow():
+            for target_format in ('parquet', 'feather'):
+                cases.append((f'csv_to_{target_format}_tall', False,
+                              lambda: ([corpus['csv']['tall']], _total_size([corpus['csv']['tall']])),
+                              lambda items, workers, fmt=target_format: p.convert_table(items, fmt)))
+        if corpus['images']:
+            cases.append(('image_convert_jpeg', True, files_setup('images'),
+                          lambda items, workers: self._parallel(
+                              lambda chunk: p.convert_image_format(chunk, 'jpeg', 85), items, workers)))
+            cases.append(('find_similar_images', True, files_setup('images'),
+                          lambda items, workers: len(items) - len(
+                              p.find_similar_images(items, max_workers=workers)['errors'])))
+        return cases
+
+    def run(self, only=None, log=print):
+        """执行所有用例并返回结果字典"""
+        results = {}
+        for name, concurrent, setup, run in self.cases():
+            if only and name not in only:
+                continue
+            for workers in (self.workers if concurrent else [1]):
+                timings = []
+                peak = None
+                growth = None
+                files = 0
+                size = 0
+                for _ in range(self.repeat):
+                    items, size = setup()
+                    gc.collect()
+                    with PeakRSSMonitor() as monitor:
+                        start = time.perf_counter()
+                        files = run(items, workers)
+                        timings.append(time.perf_counter() - start)
+                    if monitor.peak is not None:
+                        peak = max(peak or 0, monitor.peak)
+                    if monitor.growth is not None:
+                        growth = max(growth or 0, monitor.growth)
+
+                seconds = statistics.median(timings)
+                key = f"{name}@{workers}"
+                results[key] = {
+                    'case': name,
+                    'workers': workers,
+                    'seconds': seconds,
+                    'min_seconds': min(timings),
+                    'files': files,
+                    'bytes': size,
+                    'files_per_sec': files / seconds if seconds else None,
+                    'mb_per_sec': size / seconds / 1024 / 1024 if seconds and size else None,
+                    'peak_rss': peak,
+                    'rss_growth': growth,
+                }
+                log(format_result(key, results[key]))
+        return results
+
+
+def format_result(key, result):
+    """格式化单条结果"""
+    rss = result['peak_rss']
+    growth = result.get('rss_growth')
+    mbps = result['mb_per_sec']
+    return (f"{key:<34} {result['seconds'] * 1000:>10.1f} ms  "
+            f"{result['files_per_sec'] or 0:>10.1f} 文件/秒  "
+            f"{(f'{mbps:.1f}' if mbps else '-'):>8} MB/秒  "
+            f"RSS增长 {(f'{growth / 1024 / 1024:.1f} MB' if growth is not None else '-'):>9}  "
+            f"(进程峰值 {(f'{rss / 1024 / 1024:.1f} MB' if rss else '-')})")
+
+
+def compare_results(current, baseline, threshold=0.1):
+    """
+    与基线结果对比
+
+    Args:
+        current: 本次结果
+        baseline: 基线结果
+        threshold: 允许的耗时增长比例，超过即视为回退
+
+    Returns:
+        list: 回退用例列表 (用例, 基线耗时, 本次耗时, 变化比例)
+    """
+    regressions = []
+    for key, result in current.items():
+        base = baseline.get(key)
+        if not base or not base.get('seconds'):
+            continue
+        change = result['seconds'] / base['seconds'] - 1
+        if change > threshold:
+            regressions.append((key, base['seconds'], result['seconds'], change))
+    return regressions
+
+
+def save_results(path, results, scale):
+    """保存结果（含环境信息）为JSON"""
+    payload = {
+        'scale': scale,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path):
+    """读取保存的结果"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="FileProcessor 性能基准测试")
+    parser.add_argument('--scale', default='small', choices=sorted(CORPUS_SCALES))
+    parser.add_argument('--workers', default='1,4', help="并发数列表，逗号分隔")
+    parser.add_argument('--repeat', type=int, default=3, help="每个用例重复次数（取中位数）")
+    parser.add_argument('--fsync', default='file', choices=FSYNC_MODES, help="写入落盘策略")
+    parser.add_argument('--cases', help="仅运行指定用例，逗号分隔")
+    parser.add_argument('--work-dir', help="语料目录（默认使用临时目录并在结束后删除）")
+    parser.add_argument('--output', help="结果输出JSON路径")
+    parser.add_argument('--save-baseline', help="把本次结果保存为基线")
+    parser.add_argument('--compare', help="与指定基线对比")
+    parser.add_argument('--threshold', type=float, default=0.1, help="回退阈值（耗时增长比例）")
+    args = parser.parse_args(argv)
+
+    workers = [int(w) for w in args.workers.split(',') if w.strip()]
+    only = set(args.cases.split(',')) if args.cases else None
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='sfbp_bench_')
+    try:
+        suite = BenchmarkSuite(work_dir, args.scale, workers, args.repeat, fsync=args.fsync)
+        print(f"生成 {args.scale} 规模语料: {work_dir}")
+        suite.prepare()
+        results = suite.run(only)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        save_results(args.output, results, args.scale)
+    if args.save_baseline:
+        save_results(args.save_baseline, results, args.scale)
+        print(f"基线已保存: {args.save_baseline}")
+
+    if args.compare:
+        baseline = load_results(args.compare)
+        if baseline.get('scale') != args.scale:
+            print(f"警告: 基线规模为 {baseline.get('scale')}，与本次 {args.scale} 不一致")
+        regressions = compare_results(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能回退 (阈值 {args.threshold:.0%}):")
+            for key, before, after, change in regressions:
+                print(f"  {key}: {before * 1000:.1f} ms → {after * 1000:.1f} ms (+{change:.0%})")
+            return 1
+        print("未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
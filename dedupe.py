@@ -0,0 +1,341 @@
+"""
+重复文件合并模块
+Duplicate Reclaim Module
+
+把内容完全相同的重复文件替换为指向同一数据的硬链接，或在支持的文件系统（Btrfs、XFS 等）上
+替换为写时复制的 reflink 副本，释放重复占用的空间而不改变任何文件路径。
+替换前逐字节确认内容一致，替换通过临时文件 + 重命名原子完成；每个被替换的文件都记入日志，
+可随时根据日志撤销（重新拆分为独立的文件）。
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from atomic_io import AtomicWriter, fsync_directory
+from duplicate_finder import find_duplicates
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEDUPE_MODES = ('hardlink', 'reflink')
+
+# Linux FICLONE ioctl: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def default_journal_path():
+    """默认日志文件位置（用户目录下）"""
+    name = f"dedupe_{time.strftime('%Y%m%d_%H%M%S')}.jsonl"
+    return str(Path.home() / '.smart_file_processor' / 'dedupe' / name)
+
+
+def same_content(path_a, path_b):
+    """逐字节比较两个文件的内容"""
+    with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+        if os.fstat(a.fileno()).st_size != os.fstat(b.fileno()).st_size:
+            return False
+        while True:
+            chunk_a = a.read(_CHUNK_SIZE)
+            if chunk_a != b.read(_CHUNK_SIZE):
+                return False
+            if not chunk_a:
+                return True
+
+
+def _same_state(st, path):
+    """文件在比较之后是否未被修改或替换（path 也可以是已打开的文件描述符）"""
+    now = os.stat(path)
+    return (now.st_ino, now.st_size, now.st_mtime_ns) == (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _owner_key(st):
+    """硬链接共享同一 inode 的属主和权限，只有这些都相同的文件才能合并为硬链接"""
+    return st.st_uid, st.st_gid, stat.S_IMODE(st.st_mode)
+
+
+def _temp_name(path):
+    """同目录下的临时文件名（与原子写入的临时文件命名一致）"""
+    return os.path.join(os.path.dirname(os.path.abspath(path)),
+                        f".{os.path.basename(path)}.{os.urandom(4).hex()}.tmp")
+
+
+def _hardlink(source, path, st, source_st, fsync, before_swap):
+    """
+    把 path 原子地替换为 source 的硬链接
+
+    st、source_st 为逐字节比较时两个文件的状态，替换前确认两者都未变化；
+    before_swap 在替换前调用（记录日志），保证替换后崩溃也能撤销。
+    """
+    while True:
+        tmp_path = _temp_name(path)
+        try:
+            os.link(source, tmp_path)
+            break
+        except FileExistsError:
+            continue
+    try:
+        # 临时链接指向的正是将要替换进去的 inode，检查它即可确认保留的文件未被修改或替换
+        if not _same_state(source_st, tmp_path):
+            raise Exception(f"比较期间 {source} 已被修改")
+        if not _same_state(st, path):
+            raise Exception("比较期间文件已被修改")
+        before_swap()
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+    if fsync != 'none':
+        fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def _reflink(source, path, st, source_st, fsync, before_swap):
+    """把 path 原子地替换为 source 的 reflink 副本（保留 path 原有的权限和时间），检查同 _hardlink"""
+    if fcntl is None:
+        raise Exception("当前系统不支持 reflink")
+    writer = AtomicWriter('none' if fsync == 'none' else 'file', preserve_times=True)
+    with open(source, 'rb') as src, writer.open(path, 'wb') as f:
+        f.flush()
+        fcntl.ioctl(f.fileno(), FICLONE, src.fileno())
+        if not _same_state(source_st, src.fileno()):
+            raise Exception(f"比较期间 {source} 已被修改")
+        if not _same_state(st, path):
+            raise Exception("比较期间文件已被修改")
+        before_swap()
+
+
+def _pick_keeper(paths):
+    """选择保留的文件：已有硬链接最多的一个（相同时取第一个）"""
+    return max(paths, key=lambda p: os.stat(p).st_nlink)
+
+
+def _split_by_owner(paths):
+    """按属主和权限把一组重复文件细分，硬链接只在同一细分组内进行"""
+    parts = {}
+    for path in paths:
+        parts.setdefault(_owner_key(os.stat(path)), []).append(path)
+    return list(parts.values())
+
+
+class _Journal:
+    """线程安全的 JSON lines 日志，每条记录写入后立即刷新"""
+
+    def __init__(self, path, header):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self.write(header)
+
+    def write(self, record, sync=False):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+def dedupe_groups(groups, mode='hardlink', journal_path=None, dry_run=False, max_workers=None,
+                  fsync='file'):
+    """
+    合并重复文件
+
+    Args:
+        groups: 重复文件组，每组为路径列表或 duplicate_finder.find_duplicates 返回的字典
+        mode: 'hardlink' 或 'reflink'
+        journal_path: 日志文件路径，默认保存在用户目录下
+        dry_run: 只逐字节确认并统计可节省的空间，不修改文件
+        max_workers: 并行线程数
+        fsync: 'none' 时替换后不对目录执行 fsync
+
+    Returns:
+        dict: files_linked、bytes_saved、skipped（已是同一文件）、
+            mismatched（硬链接模式下属主或权限与其他副本都不同而未合并的文件数）、errors（路径与原因）、journal
+    """
+    if mode not in DEDUPE_MODES:
+        raise Exception(f"不支持的去重方式: {mode}")
+    if mode == 'reflink' and fcntl is None:
+        raise Exception("当前系统不支持 reflink")
+
+    tasks = []
+    errors = []
+    mismatched = 0
+    for group in groups:
+        paths = group['paths'] if isinstance(group, dict) else list(group)
+        try:
+            parts = _split_by_owner(paths) if mode == 'hardlink' else [paths]
+            for part in parts:
+                if len(part) < 2:
+                    mismatched += len(part)
+                    continue
+                keeper = _pick_keeper(part)
+                tasks.extend((keeper, path) for path in part if path != keeper)
+        except OSError as e:
+            errors.append((paths[0], str(e)))
+
+    journal = None
+    if not dry_run:
+        journal_path = journal_path or default_journal_path()
+        journal = _Journal(journal_path, {'type': 'header', 'mode': mode,
+                                          'time': time.strftime('%Y-%m-%d %H:%M:%S')})
+    link = _hardlink if mode == 'hardlink' else _reflink
+    result = {'files_linked': 0, 'bytes_saved': 0, 'skipped': 0, 'mismatched': mismatched, 'errors': errors,
+              'journal': journal_path if journal else None}
+    lock = threading.Lock()
+
+    def process(task):
+        keeper, path = task
+        try:
+            keeper_st = os.stat(keeper)
+            st = os.stat(path)
+            if (st.st_dev, st.st_ino) == (keeper_st.st_dev, keeper_st.st_ino):
+                with lock:
+                    result['skipped'] += 1
+                return
+            if mode == 'hardlink' and _owner_key(st) != _owner_key(keeper_st):
+                # 分组后属主或权限又被修改
+                with lock:
+                    result['mismatched'] += 1
+                return
+            if mode == 'hardlink' and st.st_dev != keeper_st.st_dev:
+                raise Exception("与保留的文件不在同一文件系统")
+            if not same_content(keeper, path):
+                raise Exception(f"内容与 {keeper} 不一致")
+            if journal:
+                record = {
+                    'path': path, 'target': keeper, 'mode': mode, 'size': st.st_size,
+                    'st_mode': st.st_mode, 'uid': st.st_uid, 'gid': st.st_gid,
+                    'atime_ns': st.st_atime_ns, 'mtime_ns': st.st_mtime_ns,
+                }
+                recorded = []
+
+                def before_swap():
+                    # 先记录再替换：替换后立即崩溃时日志中也已有记录，可以撤销
+                    journal.write(record, sync=fsync != 'none')
+                    recorded.append(path)
+
+                try:
+                    link(keeper, path, st, keeper_st, fsync, before_swap)
+                except BaseException:
+                    if recorded:
+                        journal.write({'type': 'abort', 'path': path})
+                    raise
+            with lock:
+                result['files_linked'] += 1
+                result['bytes_saved'] += st.st_size
+        except Exception as e:
+            with lock:
+                errors.append((path, str(e)))
+
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) * 2)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(process, tasks):
+                pass
+    finally:
+        if journal:
+            journal.close()
+    return result
+
+
+def _split_copy(path, record, fsync):
+    """把 path 重新写成一个独立的文件，并恢复日志中记录的权限、属主和时间"""
+    writer = AtomicWriter('none' if fsync == 'none' else 'file', preserve_times=False)
+    with open(path, 'rb') as src, writer.open(path, 'wb') as f:
+        shutil.copyfileobj(src, f, _CHUNK_SIZE)
+    os.chmod(path, record['st_mode'] & 0o7777)
+    if hasattr(os, 'chown'):
+        with contextlib.suppress(OSError):
+            os.chown(path, record['uid'], record['gid'])
+    os.utime(path, ns=(record['atime_ns'], record['mtime_ns']))
+
+
+def undo_journal(journal_path, fsync='file'):
+    """
+    根据日志撤销合并：把每个被替换的文件重新拆分为独立的副本
+
+    硬链接已被其他操作替换（不再与保留的文件是同一文件）的记录会被跳过。
+
+    Returns:
+        dict: files_restored、skipped、errors（路径与原因）
+    """
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    # 已记录但随后替换失败的文件
+    aborted = {record['path'] for record in records if record.get('type') == 'abort'}
+
+    result = {'files_restored': 0, 'skipped': 0, 'errors': []}
+    for record in reversed(records):
+        if record.get('type') in ('header', 'abort'):
+            continue
+        if record['path'] in aborted:
+            result['skipped'] += 1
+            continue
+        path = record['path']
+        try:
+            if record['mode'] == 'hardlink':
+                if not os.path.exists(record['target']) or not os.path.samefile(path, record['target']):
+                    result['skipped'] += 1
+                    continue
+            elif not os.path.exists(path):
+                result['skipped'] += 1
+                continue
+            _split_copy(path, record, fsync)
+            result['files_restored'] += 1
+        except Exception as e:
+            result['errors'].append((path, str(e)))
+    return result
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="用硬链接或 reflink 合并重复文件")
+    parser.add_argument('folder', nargs='?')
+    parser.add_argument('--mode', choices=DEDUPE_MODES, default='hardlink')
+    parser.add_argument('--journal', help="日志文件路径")
+    parser.add_argument('--dry-run', action='store_true', help="只统计可节省的空间，不修改文件")
+    parser.add_argument('--undo', metavar='JOURNAL', help="根据日志撤销之前的合并")
+    parser.add_argument('--workers', type=int, help="并行线程数")
+    args = parser.parse_args(argv)
+
+    if args.undo:
+        result = undo_journal(args.undo)
+        print(f"撤销完成: 恢复 {result['files_restored']} 个文件，跳过 {result['skipped']} 个")
+    else:
+        if not args.folder:
+            parser.error("需要指定文件夹")
+        paths = [os.path.join(root, name) for root, _, names in os.walk(args.folder) for name in names]
+        groups = find_duplicates(paths, max_workers=args.workers)
+        result = dedupe_groups(groups, args.mode, args.journal, args.dry_run, args.workers)
+        action = "可合并" if args.dry_run else "已合并"
+        print(f"{action} {result['files_linked']} 个文件，节省 {result['bytes_saved']} 字节")
+        if result['mismatched']:
+            print(f"{result['mismatched']} 个文件的属主或权限与其他副本不同，未合并为硬链接（可使用 --mode reflink）")
+        if result['journal']:
+            print(f"日志: {result['journal']}")
+    for path, error in result['errors']:
+        print(f"失败 {path}: {error}")
+    return 1 if result['errors'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,104 @@
+"""
+重复文件查找模块
+Duplicate File Finder Module
+
+分三步缩小范围：先按文件大小分组，只对大小相同的文件读取开头一小段计算哈希，
+仍然相同的再计算完整哈希。大部分文件在第一步就被排除，不需要读取内容。
+指向同一数据的硬链接只计一次。
+"""
+
+import hashlib
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+# 第二步读取的字节数，不超过该大小的文件此时已完成完整哈希
+PARTIAL_SIZE = 64 * 1024
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path, limit=None):
+    """
+    计算文件内容（或前 limit 字节）的哈希值
+
+    Returns:
+        bytes: BLAKE2b 摘要
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(_CHUNK_SIZE if remaining is None else min(_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.digest()
+
+
+def _regroup(groups, key_func, executor):
+    """对每组文件计算新的键并按键细分，丢弃只剩一个文件的组和读取失败的文件"""
+    paths = [path for group in groups for path in group]
+
+    def safe_key(path):
+        try:
+            return key_func(path)
+        except OSError:
+            return None
+
+    buckets = {}
+    for path, key in zip(paths, executor.map(safe_key, paths)):
+        if key is not None:
+            buckets.setdefault(key, []).append(path)
+    return [group for group in buckets.values() if len(group) > 1]
+
+
+def find_duplicates(file_paths, partial_size=PARTIAL_SIZE, max_workers=None):
+    """
+    查找内容完全相同的文件
+
+    Args:
+        file_paths: 文件路径列表
+        partial_size: 第二步读取的字节数
+        max_workers: 计算哈希的线程数
+
+    Returns:
+        list: 重复文件组 [{'size': 单个文件大小, 'paths': [路径, ...]}]，按可节省空间从大到小排序
+    """
+    by_size = {}
+    seen = set()
+    for path in file_paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        # 空文件不占用空间，硬链接已共享数据
+        if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+            continue
+        inode = (st.st_dev, st.st_ino)
+        if inode in seen:
+            continue
+        seen.add(inode)
+        by_size.setdefault(st.st_size, []).append(path)
+
+    sizes = {}
+    candidates = []
+    for size, group in by_size.items():
+        if len(group) > 1:
+            candidates.append(group)
+            for path in group:
+                sizes[path] = size
+
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) * 2)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        groups = _regroup(candidates,
+                          lambda p: (sizes[p], file_digest(p, partial_size)), executor)
+        small = [g for g in groups if sizes[g[0]] <= partial_size]
+        large = [g for g in groups if sizes[g[0]] > partial_size]
+        groups = small + _regroup(large, lambda p: (sizes[p], file_digest(p)), executor)
+
+    results = [{'size': sizes[group[0]], 'paths': sorted(group)} for group in groups]
+    results.sort(key=lambda g: g['size'] * (len(g['paths']) - 1), reverse=True)
+    return results
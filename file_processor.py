@@ -3,17 +3,40 @@
 File Processing Core Logic Module
 """
 
+import errno
+import io
 import os
 import shutil
-import pandas as pd
 from PIL import Image
 import re
 from pathlib import Path
+from archive_processor import rewrite_archive
+from atomic_io import AtomicWriter
+from dedupe import dedupe_groups, undo_journal
+from duplicate_finder import find_duplicates
+from image_hash import group_similar, hash_images
+from metrics import NULL_METRICS, instrumented
+from scan_results import ScanResults
+from table_io import SOURCE_FORMATS, TABLE_FORMATS, convert_table, target_path
+from text_encoding import AUTO, decode_text, encode_text
+from text_rules import TextRuleSet
+from text_search import SearchQuery, search_files
+from trigram_index import TEXT_EXTENSIONS
 
 class FileProcessor:
     """文件处理器核心类"""
     
-    def __init__(self):
+    def __init__(self, metrics=None, fsync='file', preserve_times=True):
+        """
+        Args:
+            metrics: 可选的指标采集器(MetricsRecorder)，默认不采集
+            fsync: 写入落盘策略，'file'=逐文件fsync，'batch'=整批统一fsync，'none'=不fsync
+            preserve_times: 原地修改文件时是否保留原有的访问/修改时间
+        """
+        self.metrics = metrics or NULL_METRICS
+        self.fsync = fsync
+        self.preserve_times = preserve_times
+        
         # 文件类型分类映射
         self.file_type_categories = {
             '图片': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff', '.svg'],
@@ -28,8 +51,47 @@ class FileProcessor:
             '数据': ['.json', '.xml', '.sql', '.db', '.sqlite']
         }
     
-    def batch_text_replace(self, file_paths, find_text, replace_text, encoding='utf-8', 
-                          case_sensitive=False, use_regex=False):
+    def _atomic_writer(self):
+        """创建一次批处理使用的原子写入器"""
+        return AtomicWriter(self.fsync, self.preserve_times, self.metrics)
+    
+    def _read_text(self, file_path, encoding=AUTO):
+        """
+        读取并解码文本文件
+        
+        Returns:
+            tuple: (文本内容, 实际编码)
+        """
+        with self.metrics.phase('read'):
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        with self.metrics.phase('decode'):
+            return decode_text(data, encoding)
+    
+    def _write_text(self, writer, file_path, content, encoding, source_encoding=None):
+        """按指定编码原子地写回文本文件，换行符保持原样"""
+        with self.metrics.phase('encode'):
+            data = encode_text(content, encoding, source_encoding)
+        with self.metrics.phase('write'):
+            writer.write_bytes(file_path, data)
+    
+    @staticmethod
+    def _replace_text(content, find_text, replace_text, case_sensitive, use_regex):
+        """对文本执行一次查找替换"""
+        if use_regex:
+            if case_sensitive:
+                return re.sub(find_text, replace_text, content)
+            pattern = re.compile(find_text, re.IGNORECASE)
+            return pattern.sub(replace_text, content)
+        if case_sensitive:
+            return content.replace(find_text, replace_text)
+        # 不区分大小写的普通替换
+        pattern = re.compile(re.escape(find_text), re.IGNORECASE)
+        return pattern.sub(replace_text, content)
+    
+    @instrumented
+    def batch_text_replace(self, file_paths, find_text, replace_text, encoding=AUTO, 
+                          case_sensitive=False, use_regex=False, target_encoding=None, index=None):
         """
         批量文本替换
         
@@ -37,45 +99,142 @@ class FileProcessor:
             file_paths: 文件路径列表
             find_text: 要查找的文本
             replace_text: 替换文本
-            encoding: 文件编码
+            encoding: 文件编码，'auto' 表示逐个文件自动检测
             case_sensitive: 是否区分大小写
             use_regex: 是否使用正则表达式
+            target_encoding: 写回时转换到的编码，默认保持原编码
+            index: 可选的 TrigramIndex，用于预先排除不可能包含查找内容的文件
             
         Returns:
             int: 成功处理的文件数量
         """
+        if index is not None and not target_encoding:
+            file_paths = index.candidates(file_paths, find_text, use_regex)
+        
+        metrics = self.metrics
         count = 0
-        for file_path in file_paths:
-            try:
-                with open(file_path, 'r', encoding=encoding) as f:
-                    content = f.read()
-                
-                # 执行替换
-                if use_regex:
-                    if case_sensitive:
-                        new_content = re.sub(find_text, replace_text, content)
-                    else:
-                        pattern = re.compile(find_text, re.IGNORECASE)
-                        new_content = pattern.sub(replace_text, content)
-                else:
-                    if case_sensitive:
-                        new_content = content.replace(find_text, replace_text)
-                    else:
-                        # 不区分大小写的普通替换
-                        pattern = re.compile(re.escape(find_text), re.IGNORECASE)
-                        new_content = pattern.sub(replace_text, content)
-                
-                # 写回文件
-                with open(file_path, 'w', encoding=encoding) as f:
-                    f.write(new_content)
+        with self._atomic_writer() as writer:
+            for file_path in file_paths:
+                try:
+                    with metrics.file(file_path) as record:
+                        content, source_encoding = self._read_text(file_path, encoding)
+                    
+                        # 执行替换
+                        with metrics.phase('transform'):
+                            new_content = self._replace_text(content, find_text, replace_text,
+                                                             case_sensitive, use_regex)
+                    
+                        # 写回文件（默认保持原编码，内容和编码都未变化时跳过写入）
+                        if new_content != content or target_encoding:
+                            self._write_text(writer, file_path, new_content,
+                                             target_encoding or source_encoding, source_encoding)
+                            record.output(file_path)
                 
-                count += 1
+                    count += 1
                 
-            except Exception as e:
-                raise Exception(f"处理文件 {file_path} 时出错: {str(e)}")
+                except Exception as e:
+                    raise Exception(f"处理文件 {file_path} 时出错: {str(e)}")
         
         return count
     
+    def preview_text_replace(self, file_paths, find_text, replace_text=None, encoding=AUTO,
+                             case_sensitive=False, use_regex=False, max_matches=1000,
+                             max_snippets=3, context=40, max_workers=None, index=None):
+        """
+        预览文本替换（只读），并行扫描文件并按完成顺序逐个返回结果
+        
+        Args:
+            file_paths: 文件路径列表
+            find_text: 要查找的文本
+            replace_text: 替换文本，用于在片段中显示替换结果
+            encoding: 文件编码，'auto' 表示逐个文件自动检测
+            case_sensitive: 是否区分大小写
+            use_regex: 是否使用正则表达式
+            max_matches: 每个文件的匹配计数上限，达到后停止扫描该文件
+            max_snippets: 每个文件最多返回的上下文片段数
+            context: 片段中匹配项前后保留的字符数
+            max_workers: 并发线程数
+            index: 可选的 TrigramIndex，用于预先排除不可能包含查找内容的文件
+            
+        Yields:
+            dict: 单个文件的匹配统计和上下文片段
+        """
+        query = SearchQuery(find_text, replace_text, case_sensitive, use_regex)
+        if index is not None:
+            file_paths = index.candidates(file_paths, find_text, use_regex)
+        return search_files(file_paths, query, encoding, max_workers,
+                            max_matches=max_matches, max_snippets=max_snippets, context=context)
+    
+    @instrumented
+    def batch_text_replace_rules(self, file_paths, rules, encoding=AUTO, target_encoding=None,
+                                 index=None):
+        """
+        按规则集批量替换文本，每个文件只读写一次
+        
+        Args:
+            file_paths: 文件路径列表
+            rules: TextRuleSet，或 (查找, 替换) 列表（按区分大小写的字面量处理）
+            encoding: 文件编码，'auto' 表示逐个文件自动检测
+            target_encoding: 写回时转换到的编码，默认保持原编码
+            index: 可选的 TrigramIndex，用于预先排除不可能命中任何规则的文件
+            
+        Returns:
+            dict: 处理结果统计，rule_hits 为每条规则的命中次数
+        """
+        if not isinstance(rules, TextRuleSet):
+            rules = TextRuleSet.from_pairs(rules)
+        if index is not None and not target_encoding:
+            file_paths = index.candidates_any(
+                file_paths, [(rule.find_text, rule.use_regex) for rule in rules.rules])
+        
+        metrics = self.metrics
+        files_processed = 0
+        files_changed = 0
+        rule_hits = [0] * len(rules)
+        with self._atomic_writer() as writer:
+            for file_path in file_paths:
+                try:
+                    with metrics.file(file_path) as record:
+                        content, source_encoding = self._read_text(file_path, encoding)
+                        
+                        with metrics.phase('transform'):
+                            new_content, hits = rules.apply(content)
+                        
+                        if new_content != content or target_encoding:
+                            self._write_text(writer, file_path, new_content,
+                                             target_encoding or source_encoding, source_encoding)
+                            record.output(file_path)
+                    
+                    files_processed += 1
+                    if new_content != content:
+                        files_changed += 1
+                    for i, hit in enumerate(hits):
+                        rule_hits[i] += hit
+                
+                except Exception as e:
+                    raise Exception(f"处理文件 {file_path} 时出错: {str(e)}")
+        
+        return {
+            'files_processed': files_processed,
+            'files_changed': files_changed,
+            'rule_hits': rule_hits
+        }
+    
+    def _encode_image(self, img, target_format, quality):
+        """把已加载的图片编码为目标格式，返回 BytesIO"""
+        # 转换为RGB模式（JPG需要）
+        with self.metrics.phase('transform'):
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGB')
+        
+        # 按扩展名查找 Pillow 的格式名（'jpg' -> 'JPEG'）
+        pil_format = Image.registered_extensions().get(f".{target_format.lower()}", target_format.upper())
+        with self.metrics.phase('encode'):
+            buffer = io.BytesIO()
+            img.save(buffer, format=pil_format, quality=quality, optimize=True)
+        return buffer
+    
+    @instrumented
     def convert_image_format(self, image_paths, target_format, quality=85):
         """
         转换图片格式
@@ -88,88 +247,235 @@ class FileProcessor:
         Returns:
             int: 成功转换的图片数量
         """
+        metrics = self.metrics
         count = 0
-        for image_path in image_paths:
-            try:
-                with Image.open(image_path) as img:
-                    # 转换为RGB模式（JPG需要）
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        img = img.convert('RGB')
+        with self._atomic_writer() as writer:
+            for image_path in image_paths:
+                try:
+                    with metrics.file(image_path) as record, Image.open(image_path) as img:
+                        with metrics.phase('read'):
+                            img.load()
                     
-                    # 新文件名
-                    dir_name = os.path.dirname(image_path)
-                    base_name = os.path.splitext(os.path.basename(image_path))[0]
-                    new_path = os.path.join(dir_name, f"{base_name}.{target_format}")
+                        # 新文件名
+                        dir_name = os.path.dirname(image_path)
+                        base_name = os.path.splitext(os.path.basename(image_path))[0]
+                        new_path = os.path.join(dir_name, f"{base_name}.{target_format}")
                     
-                    # 保存图片
-                    img.save(new_path, format=target_format.upper(), quality=quality, optimize=True)
-                    count += 1
+                        # 编码并保存图片
+                        buffer = self._encode_image(img, target_format, quality)
+                        with metrics.phase('write'):
+                            writer.write_bytes(new_path, buffer.getbuffer(), preserve_times=False)
+                        record.output(new_path)
+                        count += 1
                     
-            except Exception as e:
-                raise Exception(f"转换图片 {image_path} 时出错: {str(e)}")
+                except Exception as e:
+                    raise Exception(f"转换图片 {image_path} 时出错: {str(e)}")
         
         return count
     
-    def csv_to_excel(self, csv_paths):
+    def _convert_tables(self, table_paths, target_format, engine, label):
+        """逐个转换表格文件，原子地写入同目录下的新文件"""
+        metrics = self.metrics
+        count = 0
+        with self._atomic_writer() as writer:
+            for table_path in table_paths:
+                try:
+                    with metrics.file(table_path) as record:
+                        new_path = target_path(table_path, target_format)
+                        
+                        # 读取、转换并写入临时文件
+                        with metrics.phase('convert'):
+                            with writer.open(new_path, 'wb', preserve_times=False) as f:
+                                convert_table(table_path, f, target_format, engine)
+                        record.output(new_path)
+                    count += 1
+                
+                except Exception as e:
+                    raise Exception(f"转换{label}文件 {table_path} 时出错: {str(e)}")
+        
+        return count
+    
+    @instrumented
+    def csv_to_excel(self, csv_paths, engine='auto'):
         """
         CSV转Excel
         
         Args:
             csv_paths: CSV文件路径列表
+            engine: 'auto'（安装了 pyarrow 时多线程解析CSV）、'pyarrow' 或 'pandas'
             
         Returns:
             int: 成功转换的文件数量
         """
-        count = 0
-        for csv_path in csv_paths:
-            try:
-                # 读取CSV
-                df = pd.read_csv(csv_path)
-                
-                # 生成Excel文件名
-                dir_name = os.path.dirname(csv_path)
-                base_name = os.path.splitext(os.path.basename(csv_path))[0]
-                excel_path = os.path.join(dir_name, f"{base_name}.xlsx")
-                
-                # 保存为Excel
-                df.to_excel(excel_path, index=False)
-                count += 1
-                
-            except Exception as e:
-                raise Exception(f"转换CSV文件 {csv_path} 时出错: {str(e)}")
-        
-        return count
+        return self._convert_tables(csv_paths, 'xlsx', engine, 'CSV')
     
-    def excel_to_csv(self, excel_paths):
+    @instrumented
+    def excel_to_csv(self, excel_paths, engine='auto'):
         """
         Excel转CSV
         
         Args:
             excel_paths: Excel文件路径列表
+            engine: 'auto'、'pyarrow' 或 'pandas'
             
         Returns:
             int: 成功转换的文件数量
         """
-        count = 0
-        for excel_path in excel_paths:
-            try:
-                # 读取Excel
-                df = pd.read_excel(excel_path)
-                
-                # 生成CSV文件名
-                dir_name = os.path.dirname(excel_path)
-                base_name = os.path.splitext(os.path.basename(excel_path))[0]
-                csv_path = os.path.join(dir_name, f"{base_name}.csv")
-                
-                # 保存为CSV
-                df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-                count += 1
+        return self._convert_tables(excel_paths, 'csv', engine, 'Excel')
+    
+    @instrumented
+    def convert_table(self, table_paths, target_format, engine='auto'):
+        """
+        表格格式转换（CSV、Excel、Parquet、Feather 互转）
+        
+        Args:
+            table_paths: 表格文件路径列表
+            target_format: 目标格式，'xlsx'、'csv'、'parquet' 或 'feather'
+            engine: 'auto'（安装了 pyarrow 时使用 pyarrow）、'pyarrow' 或 'pandas'
+            
+        Returns:
+            int: 成功转换的文件数量
+        """
+        return self._convert_tables(table_paths, target_format, engine, '表格')
+    
+    def _process_archives(self, archive_paths, plan):
+        """逐个重写压缩包，返回汇总的成员统计"""
+        metrics = self.metrics
+        totals = {'archives': 0, 'changed': 0, 'added': 0, 'copied': 0, 'removed': 0}
+        with self._atomic_writer() as writer:
+            for archive_path in archive_paths:
+                try:
+                    with metrics.file(archive_path) as record:
+                        stats = rewrite_archive(archive_path, writer, plan)
+                        if stats['changed'] or stats['added']:
+                            record.output(archive_path)
+                            totals['archives'] += 1
+                    for key in ('changed', 'added', 'copied', 'removed'):
+                        totals[key] += stats[key]
                 
-            except Exception as e:
-                raise Exception(f"转换Excel文件 {excel_path} 时出错: {str(e)}")
+                except Exception as e:
+                    raise Exception(f"处理压缩包 {archive_path} 时出错: {str(e)}")
         
-        return count
+        return totals
+    
+    @instrumented
+    def archive_text_replace(self, archive_paths, find_text, replace_text, encoding=AUTO,
+                             case_sensitive=False, use_regex=False, extensions=None):
+        """
+        在 zip/tar 压缩包内批量文本替换，不解压到磁盘
+        
+        Args:
+            archive_paths: 压缩包路径列表
+            find_text: 要查找的文本
+            replace_text: 替换文本
+            encoding: 成员文件编码，'auto' 表示逐个自动检测
+            case_sensitive: 是否区分大小写
+            use_regex: 是否使用正则表达式
+            extensions: 要处理的成员扩展名，默认为常见文本文件
+            
+        Returns:
+            dict: archives（被修改的压缩包数）、changed（修改的成员数）、copied（原样复制的成员数）等
+        """
+        extensions = {e.lower() for e in extensions} if extensions else TEXT_EXTENSIONS
+        metrics = self.metrics
+        
+        def transform(data):
+            with metrics.phase('decode'):
+                content, source_encoding = decode_text(data, encoding)
+            with metrics.phase('transform'):
+                new_content = self._replace_text(content, find_text, replace_text,
+                                                 case_sensitive, use_regex)
+            if new_content == content:
+                return None
+            with metrics.phase('encode'):
+                return encode_text(new_content, source_encoding, source_encoding)
+        
+        def plan(name):
+            if os.path.splitext(name)[1].lower() in extensions:
+                return name, transform
+            return None
+        
+        return self._process_archives(archive_paths, plan)
+    
+    @instrumented
+    def archive_convert_images(self, archive_paths, target_format, quality=85):
+        """
+        转换 zip/tar 压缩包内的图片格式，转换结果作为新成员加入原压缩包
+        
+        Args:
+            archive_paths: 压缩包路径列表
+            target_format: 目标格式
+            quality: 图片质量(1-100)
+            
+        Returns:
+            dict: archives（被修改的压缩包数）、added（新增的图片数）、copied（原样复制的成员数）等
+        """
+        target_ext = f".{target_format.lower()}"
+        extensions = set(self.file_type_categories['图片']) - {'.svg', target_ext}
+        
+        def transform(data):
+            with Image.open(io.BytesIO(data)) as img:
+                with self.metrics.phase('read'):
+                    img.load()
+                return self._encode_image(img, target_format, quality).getvalue()
+        
+        def plan(name):
+            base, ext = os.path.splitext(name)
+            if ext.lower() in extensions:
+                return f"{base}.{target_format}", transform
+            return None
+        
+        return self._process_archives(archive_paths, plan)
     
+    @instrumented
+    def archive_convert_tables(self, archive_paths, target_format, engine='auto'):
+        """
+        转换 zip/tar 压缩包内的表格格式（CSV、Excel、Parquet、Feather），转换结果作为新成员加入原压缩包
+        
+        Args:
+            archive_paths: 压缩包路径列表
+            target_format: 目标格式，'xlsx'、'csv'、'parquet' 或 'feather'
+            engine: 'auto'（安装了 pyarrow 时使用 pyarrow）、'pyarrow' 或 'pandas'
+            
+        Returns:
+            dict: archives（被修改的压缩包数）、added（新增的表格数）、copied（原样复制的成员数）等
+        """
+        if target_format not in TABLE_FORMATS:
+            raise Exception(f"不支持的目标格式: {target_format}")
+        
+        def plan(name):
+            base, ext = os.path.splitext(name)
+            kind = SOURCE_FORMATS.get(ext.lower())
+            new_name = base + TABLE_FORMATS[target_format]
+            if kind is None or new_name == name:
+                return None
+            
+            def transform(data):
+                buffer = io.BytesIO()
+                with self.metrics.phase('convert'):
+                    convert_table(io.BytesIO(data), buffer, target_format, engine, kind)
+                return buffer.getvalue()
+            return new_name, transform
+        
+        return self._process_archives(archive_paths, plan)
+    
+    def get_file_category(self, file_path):
+        """
+        根据扩展名返回文件所属分类
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            str: 分类名称，未知类型返回 '其他'
+        """
+        ext = Path(file_path).suffix.lower()
+        for cat, extensions in self.file_type_categories.items():
+            if ext in extensions:
+                return cat
+        return '其他'
+    
+    @instrumented
     def organize_files_by_type(self, folder_path):
         """
         按文件类型整理文件夹
@@ -184,50 +490,201 @@ class FileProcessor:
         if not folder.exists():
             raise Exception(f"文件夹不存在: {folder_path}")
         
+        # 处理文件夹中的每个文件
+        file_paths = [file_path for file_path in folder.iterdir() if file_path.is_file()]
+        return self.organize_files(folder_path, file_paths)
+    
+    @instrumented
+    def organize_files(self, folder_path, file_paths):
+        """
+        把指定文件移动到文件夹下对应的分类子文件夹
+        
+        Args:
+            folder_path: 分类子文件夹所在的文件夹
+            file_paths: 要整理的文件路径列表
+            
+        Returns:
+            dict: 整理结果统计
+        """
+        folder = Path(folder_path)
         folders_created = 0
         files_moved = 0
         
-        # 处理文件夹中的每个文件
-        for file_path in folder.iterdir():
-            if file_path.is_file():
-                # 获取文件扩展名
-                ext = file_path.suffix.lower()
-                
-                # 查找对应的分类
-                category = '其他'
-                for cat, extensions in self.file_type_categories.items():
-                    if ext in extensions:
-                        category = cat
-                        break
-                
-                # 创建分类文件夹
-                category_folder = folder / category
-                if not category_folder.exists():
+        for file_path in file_paths:
+            file_path = Path(file_path)
+            
+            category_folder = folder / self.get_file_category(file_path)
+            # 已经在所属分类文件夹中的文件（如递归提交的整理任务）不再移动，否则会与自身冲突被改名
+            if file_path.parent.resolve() == category_folder.resolve():
+                continue
+            
+            # 创建分类文件夹
+            if not category_folder.exists():
+                # 多个进程同时整理同一文件夹时，分类文件夹可能已被其他进程创建
+                try:
                     category_folder.mkdir()
                     folders_created += 1
-                
-                # 移动文件
-                try:
-                    new_path = category_folder / file_path.name
-                    # 处理文件名冲突
-                    counter = 1
-                    while new_path.exists():
+                except FileExistsError:
+                    pass
+            
+            # 移动文件
+            try:
+                new_path = category_folder / file_path.name
+                # 处理文件名冲突：以独占创建占用目标文件名，多个进程同时整理时不会互相覆盖
+                counter = 1
+                while True:
+                    try:
+                        open(new_path, 'x').close()
+                        break
+                    except FileExistsError:
                         name_parts = file_path.stem, counter, file_path.suffix
                         new_name = f"{name_parts[0]}_{name_parts[1]}{name_parts[2]}"
                         new_path = category_folder / new_name
                         counter += 1
-                    
-                    shutil.move(str(file_path), str(new_path))
-                    files_moved += 1
-                    
-                except Exception as e:
-                    raise Exception(f"移动文件 {file_path.name} 时出错: {str(e)}")
+                
+                with self.metrics.file(str(file_path)), self.metrics.phase('move'):
+                    try:
+                        # 覆盖的只是自己刚创建的占位文件；os.replace 在 Windows 上也能直接覆盖，
+                        # 只有跨设备时才需要 shutil.move 复制数据
+                        try:
+                            os.replace(file_path, new_path)
+                        except OSError as e:
+                            if e.errno != errno.EXDEV:
+                                raise
+                            shutil.move(str(file_path), str(new_path))
+                    except BaseException:
+                        if new_path.exists():
+                            new_path.unlink()
+                        raise
+                files_moved += 1
+                
+            except Exception as e:
+                raise Exception(f"移动文件 {file_path.name} 时出错: {str(e)}")
         
         return {
             'folders_created': folders_created,
             'files_moved': files_moved
         }
     
+    @instrumented
+    def scan_folder(self, folder_path, recursive=False):
+        """
+        扫描文件夹中的文件
+        
+        Args:
+            folder_path: 文件夹路径
+            recursive: 是否包含子文件夹
+            
+        Returns:
+            ScanResults: 列式存储的扫描结果（原始大小和修改时间）
+        """
+        if not os.path.isdir(folder_path):
+            raise Exception(f"文件夹不存在: {folder_path}")
+        
+        results = ScanResults()
+        root = os.fspath(folder_path)
+        stack = [root]
+        while stack:
+            folder = stack.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                # 无权限访问或扫描过程中被删除的子文件夹直接跳过，不影响其余部分
+                if folder == root:
+                    raise
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        results.append(folder, entry.name, stat.st_size, stat.st_mtime)
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                except OSError:
+                    # 扫描过程中被删除或无权限访问的文件直接跳过
+                    continue
+        
+        return results
+    
+    @instrumented
+    def find_duplicate_files(self, file_paths, max_workers=None):
+        """
+        查找内容完全相同的文件
+        
+        Args:
+            file_paths: 文件路径列表
+            max_workers: 计算哈希的线程数
+            
+        Returns:
+            list: 重复文件组 [{'size': 单个文件大小, 'paths': [路径, ...]}]，按可节省空间从大到小排序
+        """
+        with self.metrics.phase('hash'):
+            return find_duplicates(file_paths, max_workers=max_workers)
+    
+    @instrumented
+    def find_similar_images(self, image_paths, hash_type='phash', max_distance=8, max_workers=None):
+        """
+        查找相似图片（缩放、重新压缩后的副本等）
+        
+        Args:
+            image_paths: 图片路径列表
+            hash_type: 感知哈希类型，'ahash'、'dhash' 或 'phash'
+            max_distance: 视为相似的最大汉明距离(0-64)
+            max_workers: 计算哈希的进程数
+            
+        Returns:
+            dict: groups（相似图片组列表，每组按文件大小从大到小排列）和 errors（无法读取的图片及原因）
+        """
+        paths = []
+        hashes = []
+        errors = []
+        with self.metrics.phase('hash'):
+            for path, value, error in hash_images(image_paths, hash_type, max_workers):
+                if error:
+                    errors.append((path, error))
+                else:
+                    paths.append(path)
+                    hashes.append(value)
+        
+        with self.metrics.phase('compare'):
+            groups = group_similar(paths, hashes, max_distance)
+        
+        return {
+            'groups': groups,
+            'errors': errors
+        }
+    
+    @instrumented
+    def dedupe_files(self, groups, mode='hardlink', journal_path=None, dry_run=False, max_workers=None):
+        """
+        把重复文件替换为硬链接或 reflink 副本以释放空间，路径保持不变
+        
+        Args:
+            groups: find_duplicate_files 返回的重复文件组
+            mode: 'hardlink' 或 'reflink'
+            journal_path: 撤销日志路径，默认保存在用户目录下
+            dry_run: 只确认内容并统计可节省的空间，不修改文件
+            max_workers: 并行线程数
+            
+        Returns:
+            dict: files_linked、bytes_saved、skipped、mismatched、errors、journal
+        """
+        return dedupe_groups(groups, mode, journal_path, dry_run, max_workers, self.fsync)
+    
+    @instrumented
+    def undo_dedupe(self, journal_path):
+        """
+        根据日志撤销重复文件合并
+        
+        Args:
+            journal_path: dedupe_files 生成的日志文件
+            
+        Returns:
+            dict: files_restored、skipped、errors
+        """
+        return undo_journal(journal_path, self.fsync)
+    
+    @instrumented
     def get_file_info(self, file_path):
         """
         获取文件信息
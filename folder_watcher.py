@@ -0,0 +1,550 @@
+"""
+文件夹监控模块
+Folder Watch Module
+
+监控一个文件夹，只对新增或被修改的文件做出反应：Linux 上通过 ctypes 调用 inotify 接收事件，
+其他平台或 inotify 不可用时退回到定时比较文件大小和修改时间的轮询方式。
+文件在一段时间内不再变化才视为写入完成（防止处理写了一半的文件），短时间内到达的大量文件
+合并为一批，按配置的规则依次交给整理、格式转换、文本替换等现有操作处理。
+只监控文件夹本身，不监控子文件夹（整理后的分类子文件夹不会被再次处理）。
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import select
+import stat
+import struct
+import threading
+import time
+
+from atomic_io import is_temp_path
+from file_processor import FileProcessor
+from table_io import SOURCE_FORMATS, TABLE_FORMATS
+from text_rules import TextRuleSet
+from trigram_index import TEXT_EXTENSIONS
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# 下载或编辑中的临时文件后缀，这些文件完成后通常会被重命名为正式文件名
+IGNORED_SUFFIXES = ('.part', '.partial', '.crdownload', '.download', '.tmp', '.swp', '~')
+
+# 可用的处理动作
+ACTIONS = ('organize', 'convert_image', 'text_replace', 'text_rules', 'csv_to_excel', 'excel_to_csv',
+           'convert_table')
+
+# 重复执行会再次修改文件内容的动作：批处理中途失败时已完成的文件不能重试，因此逐个文件执行
+PER_FILE_ACTIONS = ('text_replace', 'text_rules')
+
+
+def is_ignored(name):
+    """判断文件名是否应忽略（隐藏文件、原子写入临时文件、未完成的下载）"""
+    return name.startswith('.') or is_temp_path(name) or name.lower().endswith(IGNORED_SUFFIXES)
+
+
+def _signature(path):
+    """返回普通文件的 (大小, 修改时间)，文件不存在或不是普通文件时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def scan_signatures(folder):
+    """返回文件夹中所有（未被忽略的）普通文件的 {文件名: (大小, 修改时间)}"""
+    signatures = {}
+    with os.scandir(folder) as it:
+        for entry in it:
+            if is_ignored(entry.name):
+                continue
+            try:
+                if entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    signatures[entry.name] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+    return signatures
+
+
+class InotifyBackend:
+    """基于 inotify 的事件源（仅 Linux）"""
+
+    name = 'inotify'
+
+    def __init__(self, folder):
+        path = ctypes.util.find_library('c') or 'libc.so.6'
+        libc = ctypes.CDLL(path, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "当前系统不支持 inotify")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"无法监控 {folder}: {os.strerror(err)}")
+
+    def read_events(self, timeout):
+        """
+        等待事件
+
+        Returns:
+            tuple: (发生变化的文件名集合, 是否发生事件队列溢出)
+        """
+        names = set()
+        overflow = False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return names, overflow
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    raise Exception("被监控的文件夹已被删除或移动")
+                elif name and not mask & IN_ISDIR:
+                    names.add(os.fsdecode(name))
+        return names, overflow
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingBackend:
+    """定时扫描文件夹、比较文件大小和修改时间的事件源"""
+
+    name = 'poll'
+
+    def __init__(self, folder, interval=2.0):
+        self.folder = folder
+        self.interval = interval
+        self._snapshot = scan_signatures(folder)
+        self._next_poll = time.monotonic() + interval
+
+    def read_events(self, timeout):
+        """
+        等待到下一次扫描时间（最多等待 timeout 秒）并返回变化的文件名
+
+        Returns:
+            tuple: (新增、修改或删除的文件名集合, False)
+        """
+        wait = self._next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set(), False
+        if wait > 0:
+            time.sleep(wait)
+        self._next_poll = time.monotonic() + self.interval
+
+        if not os.path.isdir(self.folder):
+            raise Exception("被监控的文件夹已被删除或移动")
+        snapshot = scan_signatures(self.folder)
+        previous = self._snapshot
+        self._snapshot = snapshot
+        names = {name for name, sig in snapshot.items() if previous.get(name) != sig}
+        names.update(name for name in previous if name not in snapshot)
+        return names, False
+
+    def close(self):
+        pass
+
+
+def create_backend(folder, use_inotify=None, poll_interval=2.0):
+    """
+    创建事件源
+
+    Args:
+        folder: 监控的文件夹
+        use_inotify: True=必须使用 inotify，False=使用轮询，None=优先 inotify、不可用时轮询
+        poll_interval: 轮询间隔（秒）
+    """
+    if use_inotify is not False:
+        try:
+            return InotifyBackend(folder)
+        except (OSError, AttributeError):
+            if use_inotify:
+                raise
+    return PollingBackend(folder, poll_interval)
+
+
+class WatchRule:
+    """
+    一条监控规则：扩展名匹配的文件交给指定动作处理
+
+    动作与参数:
+        organize: 按类型移动到分类子文件夹
+        convert_image: target_format、quality
+        text_replace: find_text、replace_text，以及 batch_text_replace 的其他参数
+        text_rules: rules_file（规则文件路径），以及 encoding、target_encoding
+        csv_to_excel / excel_to_csv: 可选 engine
+        convert_table: target_format（xlsx、csv、parquet、feather），可选 engine
+    """
+
+    def __init__(self, action, extensions=None, **options):
+        if action not in ACTIONS:
+            raise Exception(f"不支持的监控动作: {action}")
+        self.action = action
+        self.extensions = {self._normalize(e) for e in extensions} if extensions else None
+        self.options = options
+        self.rule_set = None
+
+        if action in ('convert_image', 'convert_table') and not options.get('target_format'):
+            raise Exception(f"{action} 规则缺少 target_format")
+        if action == 'text_replace' and not options.get('find_text'):
+            raise Exception("text_replace 规则缺少 find_text")
+        if action == 'text_rules':
+            if not options.get('rules_file'):
+                raise Exception("text_rules 规则缺少 rules_file")
+            self.rule_set = TextRuleSet.load(options.pop('rules_file'))
+
+    @staticmethod
+    def _normalize(ext):
+        ext = ext.lower()
+        return ext if ext.startswith('.') else '.' + ext
+
+    @classmethod
+    def from_dict(cls, data):
+        options = dict(data)
+        if 'action' not in options:
+            raise Exception("监控规则缺少 action 字段")
+        return cls(options.pop('action'), options.pop('extensions', None), **options)
+
+    def default_extensions(self, processor):
+        """未指定扩展名时该动作默认处理的文件类型，None 表示所有文件"""
+        if self.action == 'convert_image':
+            return {e for e in processor.file_type_categories['图片'] if e != '.svg'}
+        if self.action in ('text_replace', 'text_rules'):
+            return TEXT_EXTENSIONS
+        if self.action == 'csv_to_excel':
+            return {'.csv'}
+        if self.action == 'excel_to_csv':
+            return {'.xlsx', '.xls'}
+        if self.action == 'convert_table':
+            return set(SOURCE_FORMATS)
+        return None
+
+    def matches(self, path, processor):
+        extensions = self.extensions or self.default_extensions(processor)
+        if extensions is None:
+            return True
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in extensions:
+            return False
+        if self.action == 'convert_image':
+            # 已经是目标格式的图片不再转换
+            target = self._normalize(self.options['target_format'])
+            same = {'.jpg', '.jpeg'} if target in ('.jpg', '.jpeg') else {target}
+            return ext not in same
+        if self.action == 'convert_table':
+            return ext != TABLE_FORMATS.get(self.options['target_format'])
+        return True
+
+    def apply(self, processor, folder, paths):
+        """
+        对一批文件执行动作
+
+        Returns:
+            处理器方法的返回值
+        """
+        options = self.options
+        if self.action == 'organize':
+            return processor.organize_files(folder, paths)
+        if self.action == 'convert_image':
+            return processor.convert_image_format(paths, options['target_format'],
+                                                  options.get('quality', 85))
+        if self.action == 'text_replace':
+            options = dict(options)
+            return processor.batch_text_replace(paths, options.pop('find_text'),
+                                                options.pop('replace_text', ''), **options)
+        if self.action == 'text_rules':
+            return processor.batch_text_replace_rules(paths, self.rule_set, **options)
+        if self.action == 'csv_to_excel':
+            return processor.csv_to_excel(paths, **options)
+        if self.action == 'convert_table':
+            return processor.convert_table(paths, **options)
+        return processor.excel_to_csv(paths, **options)
+
+    def __repr__(self):
+        exts = ','.join(sorted(self.extensions)) if self.extensions else '默认'
+        return f"WatchRule({self.action}, {exts})"
+
+
+class FolderWatcher:
+    """
+    文件夹监控器
+
+    用法:
+        watcher = FolderWatcher(folder, [WatchRule('convert_image', ['.png'], target_format='jpeg'),
+                                         WatchRule('organize')])
+        watcher.run()          # 阻塞运行，另一线程调用 watcher.stop() 结束
+    """
+
+    def __init__(self, folder, rules, processor=None, debounce=2.0, batch_window=1.0,
+                 max_batch=500, poll_interval=2.0, use_inotify=None, process_existing=False,
+                 log=print):
+        """
+        Args:
+            folder: 监控的文件夹
+            rules: WatchRule 列表，每批文件按顺序依次经过所有匹配的规则
+            processor: FileProcessor 实例，默认新建
+            debounce: 文件保持不变多少秒后视为写入完成
+            batch_window: 第一个文件就绪后再等待多少秒收集同一批文件
+            max_batch: 每批最多文件数，达到后立即处理
+            poll_interval: 轮询方式下的扫描间隔（秒）
+            use_inotify: True/False 强制指定事件源，None 为自动选择
+            process_existing: 启动时是否处理文件夹中已有的文件
+            log: 日志输出函数
+        """
+        if not os.path.isdir(folder):
+            raise Exception(f"文件夹不存在: {folder}")
+        if not rules:
+            raise Exception("至少需要一条监控规则")
+        self.folder = os.path.abspath(folder)
+        self.rules = list(rules)
+        self.processor = processor or FileProcessor()
+        self.debounce = debounce
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.process_existing = process_existing
+        self.log = log
+        self.backend = None
+        self.stats = {'batches': 0, 'files': 0, 'errors': 0}
+
+        # 已处理（或确认无需处理）的文件状态，相同状态的文件不会再次处理
+        self._known = {}
+        # 等待写入完成的文件: {文件名: [最后一次变化时间, 当时的文件状态]}
+        self._pending = {}
+        # 已就绪、等待成批处理的文件
+        self._batch = []
+        self._batch_started = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        """请求停止监控（可从其他线程调用）"""
+        self._stop.set()
+
+    def _touch(self, names, now):
+        """记录发生变化的文件"""
+        for name in names:
+            if is_ignored(name):
+                continue
+            sig = _signature(os.path.join(self.folder, name))
+            if sig is None:
+                # 文件已删除或被移走
+                self._pending.pop(name, None)
+                self._known.pop(name, None)
+                continue
+            entry = self._pending.get(name)
+            if entry is None:
+                if sig == self._known.get(name):
+                    continue
+                self._pending[name] = [now, sig]
+            elif entry[1] != sig:
+                entry[0] = now
+                entry[1] = sig
+
+    def _rescan(self, now):
+        """事件队列溢出后重新扫描，找出期间遗漏的变化"""
+        self.log("事件队列溢出，重新扫描文件夹")
+        snapshot = scan_signatures(self.folder)
+        changed = [name for name, sig in snapshot.items() if self._known.get(name) != sig]
+        for name in list(self._known):
+            if name not in snapshot:
+                del self._known[name]
+        self._touch(changed, now)
+
+    def _collect_ready(self, now):
+        """把保持不变超过 debounce 秒的文件移入待处理批次"""
+        for name, (changed_at, sig) in list(self._pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+            current = _signature(os.path.join(self.folder, name))
+            if current is None:
+                del self._pending[name]
+                continue
+            if current != sig:
+                # 期间仍在写入但没有收到事件（如轮询间隔内），重新计时
+                self._pending[name] = [now, current]
+                continue
+            del self._pending[name]
+            if name not in self._batch:
+                self._batch.append(name)
+                if self._batch_started is None:
+                    self._batch_started = now
+
+    def _apply_rule(self, rule, paths):
+        if len(paths) > 1 and rule.action in PER_FILE_ACTIONS:
+            for path in paths:
+                if os.path.exists(path):
+                    self._apply_rule(rule, [path])
+            return
+        try:
+            rule.apply(self.processor, self.folder, paths)
+            return
+        except Exception as e:
+            if len(paths) == 1:
+                self.stats['errors'] += 1
+                self.log(f"{rule.action} 处理失败: {str(e)}")
+                return
+        # 整批失败时逐个重试，只跳过真正出错的文件
+        for path in paths:
+            if os.path.exists(path):
+                self._apply_rule(rule, [path])
+
+    def process_batch(self, names):
+        """按规则处理一批文件"""
+        paths = [os.path.join(self.folder, name) for name in names]
+        self.log(f"处理 {len(paths)} 个文件")
+        for rule in self.rules:
+            # 前面的规则可能已移走文件
+            matched = [p for p in paths if os.path.exists(p) and rule.matches(p, self.processor)]
+            if matched:
+                self._apply_rule(rule, matched)
+
+        # 记录处理后的状态：原地修改产生的事件不会触发重复处理
+        for name, path in zip(names, paths):
+            sig = _signature(path)
+            if sig is not None:
+                self._known[name] = sig
+        self.stats['batches'] += 1
+        self.stats['files'] += len(names)
+
+    def _flush(self, now, force=False):
+        if not self._batch:
+            return
+        if not force and len(self._batch) < self.max_batch and \
+                now - self._batch_started < self.batch_window:
+            return
+        batch = self._batch[:self.max_batch]
+        del self._batch[:self.max_batch]
+        self._batch_started = now if self._batch else None
+        self.process_batch(batch)
+
+    def run(self, duration=None):
+        """
+        开始监控，直到调用 stop() 或超过 duration 秒
+
+        Returns:
+            dict: 统计信息（批次数、文件数、错误数）
+        """
+        self._stop.clear()
+        self.backend = create_backend(self.folder, self.use_inotify, self.poll_interval)
+        self.log(f"开始监控 {self.folder}（{self.backend.name}）")
+
+        existing = scan_signatures(self.folder)
+        if self.process_existing:
+            self._touch(existing, time.monotonic() - self.debounce)
+        else:
+            self._known.update(existing)
+
+        tick = min(max(min(self.debounce, self.batch_window) / 2, 0.05), 0.5)
+        deadline = time.monotonic() + duration if duration is not None else None
+        try:
+            while not self._stop.is_set():
+                names, overflow = self.backend.read_events(tick)
+                now = time.monotonic()
+                if overflow:
+                    self._rescan(now)
+                self._touch(names, now)
+                self._collect_ready(now)
+                self._flush(now)
+                if deadline is not None and now >= deadline:
+                    break
+        finally:
+            self.backend.close()
+        self.log(f"停止监控，共处理 {self.stats['files']} 个文件")
+        return self.stats
+
+
+def load_config(path):
+    """
+    读取监控配置文件（JSON）
+
+    格式: {"debounce": 2, "batch_window": 1, "rules": [{"action": "organize"}, ...]}
+    规则中除 action、extensions 外的字段作为动作参数。
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        config = json.load(f)
+    if isinstance(config, list):
+        config = {'rules': config}
+    rules = [WatchRule.from_dict(rule) for rule in config.pop('rules', [])]
+    return rules, config
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="监控文件夹并自动处理新文件")
+    parser.add_argument('folder')
+    parser.add_argument('--config', help="监控规则配置文件（JSON）")
+    parser.add_argument('--organize', action='store_true', help="按类型整理新文件")
+    parser.add_argument('--convert-images', metavar='FORMAT', help="把新图片转换为指定格式")
+    parser.add_argument('--poll', action='store_true', help="使用轮询代替 inotify")
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="轮询间隔（秒）")
+    parser.add_argument('--debounce', type=float, help="文件保持不变多少秒后处理")
+    parser.add_argument('--batch-window', type=float, help="合并同一批文件的等待时间（秒）")
+    parser.add_argument('--existing', action='store_true', help="启动时处理已有文件")
+    args = parser.parse_args(argv)
+
+    rules, options = load_config(args.config) if args.config else ([], {})
+    if args.convert_images:
+        rules.append(WatchRule('convert_image', target_format=args.convert_images))
+    if args.organize:
+        rules.append(WatchRule('organize'))
+    if args.debounce is not None:
+        options['debounce'] = args.debounce
+    if args.batch_window is not None:
+        options['batch_window'] = args.batch_window
+
+    watcher = FolderWatcher(args.folder, rules, use_inotify=False if args.poll else None,
+                            poll_interval=args.poll_interval, process_existing=args.existing,
+                            **options)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
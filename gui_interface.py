@@ -7,8 +7,21 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import threading
-from pathlib import Path
 from file_processor import FileProcessor
+from scan_results import ScanResults
+from text_rules import TextRuleSet
+
+# 文件列表最多显示的行数，超出部分只保留在扫描结果中
+MAX_DISPLAY_ROWS = 5000
+
+# 文件列表列名与扫描结果排序字段的对应关系
+SORT_COLUMNS = {"文件名": "name", "大小": "size", "修改时间": "modified"}
+
+# 日志中最多列出的重复文件组数
+MAX_DUPLICATE_GROUPS = 200
+
+# 表格转换目标格式（界面名称 -> FileProcessor.convert_table 参数）
+TABLE_FORMAT_CHOICES = {"Parquet": "parquet", "Feather": "feather", "Excel": "xlsx", "CSV": "csv"}
 
 class FileProcessorGUI:
     """文件处理器图形界面"""
@@ -16,7 +29,10 @@ class FileProcessorGUI:
     def __init__(self, root):
         self.root = root
         self.processor = FileProcessor()
-        self.current_files = []
+        self.current_files = ScanResults()
+        self.sort_key = None
+        self.sort_reverse = False
+        self.duplicate_groups = []
         self.setup_ui()
         
     def setup_ui(self):
@@ -88,7 +104,7 @@ class FileProcessorGUI:
         
         # 设置列标题
         for col in columns:
-            self.file_tree.heading(col, text=col)
+            self.file_tree.heading(col, text=col, command=lambda c=col: self.sort_file_list(c))
             self.file_tree.column(col, width=150)
         
         self.file_tree.column("文件名", width=300)
@@ -233,16 +249,28 @@ class FileProcessorGUI:
         ttk.Checkbutton(options_frame, text="使用正则表达式", variable=self.use_regex).pack(side=tk.LEFT, padx=10)
         
         ttk.Label(options_frame, text="文件编码:").pack(side=tk.LEFT, padx=10)
-        self.file_encoding = ttk.Combobox(options_frame, values=["utf-8", "gbk", "gb2312", "ascii"], width=10)
-        self.file_encoding.set("utf-8")
+        self.file_encoding = ttk.Combobox(options_frame, values=["自动检测", "utf-8", "gbk", "gb2312", "ascii"], width=10)
+        self.file_encoding.set("自动检测")
         self.file_encoding.pack(side=tk.LEFT, padx=5)
         
+        ttk.Label(options_frame, text="转换为:").pack(side=tk.LEFT, padx=10)
+        self.target_encoding = ttk.Combobox(options_frame, values=["保持原编码", "utf-8", "utf-8-sig", "gbk"], width=12)
+        self.target_encoding.set("保持原编码")
+        self.target_encoding.pack(side=tk.LEFT, padx=5)
+        
+        # 规则文件（多条规则一次替换）
+        ttk.Label(rule_frame, text="规则文件:").grid(row=3, column=0, sticky=tk.W, pady=5)
+        self.rule_file_var = tk.StringVar()
+        ttk.Entry(rule_frame, textvariable=self.rule_file_var, width=50).grid(row=3, column=1, padx=5, pady=5)
+        ttk.Button(rule_frame, text="浏览", command=self.browse_rule_file).grid(row=3, column=2)
+        
         # 按钮区域
         btn_frame = ttk.Frame(tab)
         btn_frame.pack(fill=tk.X, pady=10)
         
         ttk.Button(btn_frame, text="预览替换结果", command=self.preview_replace).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="执行替换", command=self.execute_replace).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="按规则文件替换", command=self.execute_rule_replace).pack(side=tk.LEFT, padx=5)
     
     def create_format_convert_tab(self):
         """创建格式转换标签页"""
@@ -294,6 +322,12 @@ class FileProcessorGUI:
         
         ttk.Button(doc_btn_frame, text="CSV转Excel", command=self.csv_to_excel).pack(side=tk.LEFT, padx=10)
         ttk.Button(doc_btn_frame, text="Excel转CSV", command=self.excel_to_csv).pack(side=tk.LEFT, padx=10)
+        
+        ttk.Label(doc_btn_frame, text="转换为:").pack(side=tk.LEFT, padx=(20, 0))
+        self.table_format = ttk.Combobox(doc_btn_frame, values=list(TABLE_FORMAT_CHOICES), width=10)
+        self.table_format.set("Parquet")
+        self.table_format.pack(side=tk.LEFT, padx=5)
+        ttk.Button(doc_btn_frame, text="转换表格", command=self.convert_tables).pack(side=tk.LEFT, padx=5)
     
     def create_organize_tab(self):
         """创建文件整理标签页"""
@@ -332,7 +366,32 @@ class FileProcessorGUI:
         ttk.Entry(duplicate_frame, textvariable=self.duplicate_folder, width=60).grid(row=0, column=1, padx=5)
         ttk.Button(duplicate_frame, text="浏览", command=lambda: self.browse_organize_folder("duplicate")).grid(row=0, column=2)
         
-        ttk.Button(duplicate_frame, text="查找重复文件", command=self.find_duplicates).grid(row=1, column=0, columnspan=3, pady=10)
+        duplicate_options = ttk.Frame(duplicate_frame)
+        duplicate_options.grid(row=1, column=0, columnspan=3, sticky=tk.W, pady=5)
+        
+        ttk.Label(duplicate_options, text="查找方式:").pack(side=tk.LEFT)
+        self.duplicate_mode = ttk.Combobox(duplicate_options, values=["内容完全相同", "相似图片"], width=12)
+        self.duplicate_mode.set("内容完全相同")
+        self.duplicate_mode.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(duplicate_options, text="相似度阈值(0-16):").pack(side=tk.LEFT, padx=10)
+        self.similarity_distance = ttk.Spinbox(duplicate_options, from_=0, to=16, width=6)
+        self.similarity_distance.set(8)
+        self.similarity_distance.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(duplicate_frame, text="查找重复文件", command=self.find_duplicates).grid(row=2, column=0, columnspan=3, pady=10)
+        
+        # 合并重复文件（硬链接 / reflink），路径不变，可根据日志撤销
+        dedupe_frame = ttk.Frame(duplicate_frame)
+        dedupe_frame.grid(row=3, column=0, columnspan=3, sticky=tk.W)
+        
+        ttk.Label(dedupe_frame, text="合并方式:").pack(side=tk.LEFT)
+        self.dedupe_mode = ttk.Combobox(dedupe_frame, values=["硬链接", "reflink"], width=10)
+        self.dedupe_mode.set("硬链接")
+        self.dedupe_mode.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(dedupe_frame, text="合并重复文件", command=self.dedupe_duplicates).pack(side=tk.LEFT, padx=10)
+        ttk.Button(dedupe_frame, text="撤销合并", command=self.undo_dedupe).pack(side=tk.LEFT, padx=5)
     
     def create_log_area(self, parent):
         """创建日志显示区域"""
@@ -373,18 +432,7 @@ class FileProcessorGUI:
     def _scan_files_thread(self, folder):
         """在后台线程中扫描文件"""
         try:
-            self.current_files = []
-            
-            for file_path in Path(folder).iterdir():
-                if file_path.is_file():
-                    stat = file_path.stat()
-                    file_info = {
-                        'name': file_path.name,
-                        'path': str(file_path),
-                        'size': self.format_file_size(stat.st_size),
-                        'modified': file_path.stat().st_mtime
-                    }
-                    self.current_files.append(file_info)
+            self.current_files = self.processor.scan_folder(folder)
             
             # 在GUI线程中更新显示
             self.root.after(0, self._update_file_list)
@@ -399,13 +447,32 @@ class FileProcessorGUI:
         for item in self.file_tree.get_children():
             self.file_tree.delete(item)
         
-        # 添加新文件
-        for file_info in self.current_files:
-            self.file_tree.insert("", "end", values=(
-                file_info['name'],
-                file_info['size'],
-                self.format_timestamp(file_info['modified'])
+        # 添加新文件，只格式化实际显示的行
+        files = self.current_files
+        if self.sort_key:
+            rows = files.sorted_indices(self.sort_key, self.sort_reverse)[:MAX_DISPLAY_ROWS]
+        else:
+            rows = range(min(len(files), MAX_DISPLAY_ROWS))
+        
+        for i in rows:
+            self.file_tree.insert("", "end", iid=str(i), values=(
+                files.names[i],
+                self.format_file_size(files.sizes[i]),
+                self.format_timestamp(files.mtimes[i])
             ))
+        
+        if len(files) > MAX_DISPLAY_ROWS:
+            self.log_message(f"文件较多，列表仅显示前 {MAX_DISPLAY_ROWS} 个（共 {len(files)} 个）")
+    
+    def sort_file_list(self, column):
+        """点击列标题时按原始数值排序，再次点击切换升降序"""
+        key = SORT_COLUMNS[column]
+        if self.sort_key == key:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_key = key
+            self.sort_reverse = False
+        self._update_file_list()
     
     def format_file_size(self, size_bytes):
         """格式化文件大小显示"""
@@ -446,6 +513,19 @@ class FileProcessorGUI:
                 self.text_listbox.insert(tk.END, file)
             self.log_message(f"已选择 {len(files)} 个文本文件")
     
+    def browse_rule_file(self):
+        """浏览规则文件"""
+        filename = filedialog.askopenfilename(
+            title="选择规则文件",
+            filetypes=[
+                ("规则文件", "*.csv *.json"),
+                ("所有文件", "*.*")
+            ]
+        )
+        if filename:
+            self.rule_file_var.set(filename)
+            self.log_message(f"已选择规则文件: {filename}")
+    
     def browse_image_files(self):
         """浏览图片文件"""
         files = filedialog.askopenfilenames(
@@ -566,7 +646,53 @@ class FileProcessorGUI:
             messagebox.showwarning("警告", "请先选择要处理的文件")
             return
         
-        self.log_message("文本替换预览功能开发中...")
+        find_text = self.text_find.get()
+        if not find_text:
+            messagebox.showwarning("警告", "请输入要查找的内容")
+            return
+        
+        self.log_message(f"开始预览: 在 {len(selected_files)} 个文件中查找 \"{find_text}\"")
+        
+        # 在新线程中执行预览，结果逐个回传到日志
+        thread = threading.Thread(target=self._preview_replace_thread, args=(
+            list(selected_files), find_text, self.text_replace.get(), self.get_selected_encoding(),
+            self.case_sensitive.get(), self.use_regex.get()
+        ))
+        thread.daemon = True
+        thread.start()
+    
+    def _preview_replace_thread(self, files, find_text, replace_text, encoding, case_sensitive, use_regex):
+        """在后台线程中预览替换结果"""
+        try:
+            matched_files = 0
+            total_matches = 0
+            for result in self.processor.preview_text_replace(
+                    files, find_text, replace_text, encoding, case_sensitive, use_regex):
+                if result['error']:
+                    self.root.after(0, self.log_message, f"读取失败 {result['path']}: {result['error']}")
+                    continue
+                if not result['matches']:
+                    continue
+                
+                matched_files += 1
+                total_matches += result['matches']
+                more = "+" if result['truncated'] else ""
+                lines = [f"{result['path']}: {result['matches']}{more} 处匹配 ({result['encoding']})"]
+                for snippet in result['snippets']:
+                    lines.append(f"    第{snippet['line']}行: {snippet['before']}[{snippet['match']} → "
+                                 f"{snippet['replacement']}]{snippet['after']}")
+                self.root.after(0, self.log_message, "\n".join(lines))
+            
+            self.root.after(0, self.log_message,
+                            f"预览完成: {matched_files} 个文件共 {total_matches} 处匹配，未修改任何文件")
+            
+        except Exception as e:
+            self.root.after(0, self.log_message, f"预览错误: {str(e)}")
+    
+    def get_selected_encoding(self):
+        """获取界面选择的文件编码，自动检测时返回 'auto'"""
+        encoding = self.file_encoding.get()
+        return "auto" if encoding == "自动检测" else encoding
     
     def execute_replace(self):
         """执行文本替换"""
@@ -581,12 +707,15 @@ class FileProcessorGUI:
             return
         
         replace_text = self.text_replace.get()
-        encoding = self.file_encoding.get()
+        encoding = self.get_selected_encoding()
+        target_encoding = self.target_encoding.get()
+        if target_encoding == "保持原编码":
+            target_encoding = None
         
         try:
             count = self.processor.batch_text_replace(
                 selected_files, find_text, replace_text, encoding,
-                self.case_sensitive.get(), self.use_regex.get()
+                self.case_sensitive.get(), self.use_regex.get(), target_encoding
             )
             
             messagebox.showinfo("成功", f"成功处理 {count} 个文件")
@@ -596,6 +725,37 @@ class FileProcessorGUI:
             messagebox.showerror("错误", f"处理失败: {str(e)}")
             self.log_message(f"文本替换错误: {str(e)}")
     
+    def execute_rule_replace(self):
+        """按规则文件执行多规则替换"""
+        selected_files = self.text_listbox.get(0, tk.END)
+        if not selected_files:
+            messagebox.showwarning("警告", "请先选择要处理的文件")
+            return
+        
+        rule_file = self.rule_file_var.get()
+        if not rule_file:
+            messagebox.showwarning("警告", "请先选择规则文件")
+            return
+        
+        target_encoding = self.target_encoding.get()
+        if target_encoding == "保持原编码":
+            target_encoding = None
+        
+        try:
+            rules = TextRuleSet.load(rule_file)
+            result = self.processor.batch_text_replace_rules(
+                selected_files, rules, self.get_selected_encoding(), target_encoding
+            )
+            
+            messagebox.showinfo("成功", f"处理了 {result['files_processed']} 个文件，修改了 {result['files_changed']} 个文件")
+            self.log_message(f"规则替换完成: 共 {len(rules)} 条规则，修改了 {result['files_changed']} 个文件")
+            for rule, hits in zip(rules.rules, result['rule_hits']):
+                self.log_message(f"  {rule.find_text} → {rule.replace_text}: {hits} 处")
+            
+        except Exception as e:
+            messagebox.showerror("错误", f"处理失败: {str(e)}")
+            self.log_message(f"规则替换错误: {str(e)}")
+    
     def convert_images(self):
         """转换图片格式"""
         selected_files = self.image_listbox.get(0, tk.END)
@@ -631,6 +791,26 @@ class FileProcessorGUI:
                 messagebox.showerror("错误", f"转换失败: {str(e)}")
                 self.log_message(f"CSV转Excel错误: {str(e)}")
     
+    def convert_tables(self):
+        """把表格文件转换为所选格式（Parquet、Feather 等）"""
+        selected_files = filedialog.askopenfilenames(
+            title="选择表格文件",
+            filetypes=[
+                ("表格文件", "*.csv *.xlsx *.xls *.parquet *.feather"),
+                ("所有文件", "*.*")
+            ]
+        )
+        
+        if selected_files:
+            target_format = TABLE_FORMAT_CHOICES.get(self.table_format.get(), "parquet")
+            try:
+                count = self.processor.convert_table(selected_files, target_format)
+                messagebox.showinfo("成功", f"成功转换 {count} 个文件")
+                self.log_message(f"表格转换完成: {count} 个文件转换为 {self.table_format.get()}")
+            except Exception as e:
+                messagebox.showerror("错误", f"转换失败: {str(e)}")
+                self.log_message(f"表格转换错误: {str(e)}")
+    
     def excel_to_csv(self):
         """Excel转CSV"""
         selected_files = filedialog.askopenfilenames(
@@ -679,7 +859,108 @@ class FileProcessorGUI:
             messagebox.showwarning("警告", "请先选择要扫描的文件夹")
             return
         
-        self.log_message("重复文件查找功能开发中...")
+        similar = self.duplicate_mode.get() == "相似图片"
+        try:
+            max_distance = int(self.similarity_distance.get())
+        except ValueError:
+            max_distance = 8
+        
+        self.log_message(f"开始查找{'相似图片' if similar else '重复文件'}: {folder}")
+        
+        # 在新线程中查找，避免大目录时界面无响应
+        thread = threading.Thread(target=self._find_duplicates_thread, args=(folder, similar, max_distance))
+        thread.daemon = True
+        thread.start()
+    
+    def _find_duplicates_thread(self, folder, similar, max_distance):
+        """在后台线程中查找重复文件或相似图片"""
+        try:
+            results = self.processor.scan_folder(folder, recursive=True)
+            paths = [results.path(i) for i in range(len(results))]
+            
+            if similar:
+                image_exts = set(self.processor.file_type_categories['图片']) - {'.svg'}
+                paths = [p for p in paths if os.path.splitext(p)[1].lower() in image_exts]
+                result = self.processor.find_similar_images(paths, max_distance=max_distance)
+                groups = result['groups']
+                for path, error in result['errors'][:20]:
+                    self.root.after(0, self.log_message, f"无法读取图片 {path}: {error}")
+                lines = []
+                for n, group in enumerate(groups[:MAX_DUPLICATE_GROUPS], 1):
+                    lines.append(f"相似组 {n}（{len(group)} 张）:")
+                    lines.extend(f"    {path}" for path in group)
+                summary = f"查找完成: 在 {len(paths)} 张图片中发现 {len(groups)} 组相似图片"
+            else:
+                groups = self.processor.find_duplicate_files(paths)
+                self.duplicate_groups = groups
+                wasted = sum(g['size'] * (len(g['paths']) - 1) for g in groups)
+                lines = []
+                for n, group in enumerate(groups[:MAX_DUPLICATE_GROUPS], 1):
+                    lines.append(f"重复组 {n}（{len(group['paths'])} 个，每个 {self.format_file_size(group['size'])}）:")
+                    lines.extend(f"    {path}" for path in group['paths'])
+                summary = (f"查找完成: 在 {len(paths)} 个文件中发现 {len(groups)} 组重复文件，"
+                           f"可节省 {self.format_file_size(wasted)}")
+            
+            if len(groups) > MAX_DUPLICATE_GROUPS:
+                lines.append(f"... 仅显示前 {MAX_DUPLICATE_GROUPS} 组")
+            if lines:
+                self.root.after(0, self.log_message, "\n".join(lines))
+            self.root.after(0, self.log_message, summary)
+            
+        except Exception as e:
+            self.root.after(0, self.log_message, f"查找重复文件错误: {str(e)}")
+    
+    def dedupe_duplicates(self):
+        """用硬链接或 reflink 合并上次找到的重复文件"""
+        groups = self.duplicate_groups
+        if not groups:
+            messagebox.showwarning("警告", "请先以“内容完全相同”方式查找重复文件")
+            return
+        
+        mode = "reflink" if self.dedupe_mode.get() == "reflink" else "hardlink"
+        count = sum(len(g['paths']) - 1 for g in groups)
+        if not messagebox.askyesno("确认", f"将把 {count} 个重复文件替换为{self.dedupe_mode.get()}，"
+                                          f"文件路径不变，可通过日志撤销。是否继续？"):
+            return
+        
+        self.duplicate_groups = []
+        thread = threading.Thread(target=self._dedupe_thread, args=(groups, mode))
+        thread.daemon = True
+        thread.start()
+    
+    def _dedupe_thread(self, groups, mode):
+        """在后台线程中合并重复文件"""
+        try:
+            result = self.processor.dedupe_files(groups, mode)
+            for path, error in result['errors'][:50]:
+                self.root.after(0, self.log_message, f"合并失败 {path}: {error}")
+            self.root.after(0, self.log_message,
+                            f"合并完成: 替换了 {result['files_linked']} 个文件，"
+                            f"节省 {self.format_file_size(result['bytes_saved'])}，"
+                            f"属主或权限不同未合并 {result['mismatched']} 个，"
+                            f"失败 {len(result['errors'])} 个。撤销日志: {result['journal']}")
+        except Exception as e:
+            self.root.after(0, self.log_message, f"合并重复文件错误: {str(e)}")
+    
+    def undo_dedupe(self):
+        """根据日志撤销重复文件合并"""
+        journal = filedialog.askopenfilename(
+            title="选择合并日志",
+            filetypes=[("合并日志", "*.jsonl"), ("所有文件", "*.*")]
+        )
+        if not journal:
+            return
+        
+        try:
+            result = self.processor.undo_dedupe(journal)
+            for path, error in result['errors'][:50]:
+                self.log_message(f"撤销失败 {path}: {error}")
+            messagebox.showinfo("成功", f"撤销完成！\n恢复了 {result['files_restored']} 个独立文件")
+            self.log_message(f"撤销合并完成: 恢复 {result['files_restored']} 个文件，"
+                             f"跳过 {result['skipped']} 个已变化的文件")
+        except Exception as e:
+            messagebox.showerror("错误", f"撤销失败: {str(e)}")
+            self.log_message(f"撤销合并错误: {str(e)}")
     
     def log_message(self, message):
         """添加日志消息"""
@@ -0,0 +1,269 @@
+"""
+图片感知哈希模块
+Perceptual Image Hash Module
+
+为图片计算 64 位感知哈希（aHash / dHash / pHash），缩放、重新压缩后的副本哈希值只相差少数几位。
+解码时尽量只解码缩小后的图像（JPEG 可在解码阶段按 1/2~1/8 缩小），多进程并行计算。
+相似图片查找使用多索引哈希：把哈希分成若干段，根据抽屉原理，汉明距离不超过 r 的两个哈希
+至少有一段的距离不超过 r/段数，只需在排好序的各段中查找候选，再用 NumPy 批量计算完整距离验证，
+避免对所有图片两两比较。
+"""
+
+import functools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+from PIL import Image
+
+HASH_TYPES = ('ahash', 'dhash', 'phash')
+
+# 哈希边长（8x8 = 64 位）
+HASH_SIZE = 8
+
+# pHash 在 32x32 的缩略图上做 DCT，取左上角 8x8 的低频部分
+PHASH_SIZE = 32
+
+# 少于该数量的图片直接在当前进程中计算，省去启动进程池的开销
+MIN_PARALLEL = 64
+
+# 每次查询的哈希数量上限，限制候选对展开时的内存占用
+QUERY_BLOCK = 1 << 16
+
+
+@functools.lru_cache(maxsize=None)
+def _dct_matrix(n):
+    """n 点 DCT-II 变换矩阵（正交归一化）"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * math.sqrt(2.0 / n)
+    matrix[0] /= math.sqrt(2.0)
+    return matrix
+
+
+def _reduce(img, width, height):
+    """把图片转换为指定尺寸的灰度图，JPEG 直接以缩小的尺寸解码"""
+    img.draft('L', (width * 4, height * 4))
+    if img.mode != 'L':
+        img = img.convert('L')
+    return np.asarray(img.resize((width, height), Image.BILINEAR, reducing_gap=2.0), dtype=np.float64)
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def image_hash(img, hash_type='phash'):
+    """
+    计算已打开图片的感知哈希
+
+    Args:
+        img: PIL 图片
+        hash_type: 'ahash'、'dhash' 或 'phash'
+
+    Returns:
+        int: 64 位哈希值
+    """
+    if hash_type == 'ahash':
+        pixels = _reduce(img, HASH_SIZE, HASH_SIZE)
+        return _bits_to_int(pixels > pixels.mean())
+    if hash_type == 'dhash':
+        pixels = _reduce(img, HASH_SIZE + 1, HASH_SIZE)
+        return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+    if hash_type == 'phash':
+        pixels = _reduce(img, PHASH_SIZE, PHASH_SIZE)
+        matrix = _dct_matrix(PHASH_SIZE)
+        low = (matrix @ pixels @ matrix.T)[:HASH_SIZE, :HASH_SIZE]
+        # 直流分量远大于其他系数，不参与中位数计算
+        median = np.median(low.ravel()[1:])
+        return _bits_to_int(low > median)
+    raise Exception(f"不支持的哈希类型: {hash_type}")
+
+
+def _hash_path(path, hash_type):
+    try:
+        with Image.open(path) as img:
+            return image_hash(img, hash_type), None
+    except Exception as e:
+        return None, str(e)
+
+
+def hash_images(image_paths, hash_type='phash', max_workers=None, chunksize=32):
+    """
+    多进程计算图片哈希，按输入顺序逐个产出结果
+
+    Args:
+        image_paths: 图片路径列表
+        hash_type: 'ahash'、'dhash' 或 'phash'
+        max_workers: 进程数，默认为CPU数量；为 1 时在当前进程中计算
+        chunksize: 每次分派给子进程的图片数量
+
+    Yields:
+        tuple: (路径, 哈希值或 None, 错误信息或 None)
+    """
+    if hash_type not in HASH_TYPES:
+        raise Exception(f"不支持的哈希类型: {hash_type}")
+    paths = list(image_paths)
+    worker = functools.partial(_hash_path, hash_type=hash_type)
+
+    if max_workers == 1 or len(paths) < MIN_PARALLEL:
+        for path in paths:
+            yield (path,) + worker(path)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for path, result in zip(paths, executor.map(worker, paths, chunksize=chunksize)):
+            yield (path,) + result
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(values):
+        """逐个统计 uint64 数组中每个元素为 1 的位数"""
+        return np.bitwise_count(values)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(values):
+        """逐个统计 uint64 数组中每个元素为 1 的位数"""
+        values = np.ascontiguousarray(values, dtype=np.uint64)
+        return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def _segments(count, max_distance):
+    """
+    根据哈希数量划分分段：每段位数约为 log2(数量)，使每个分段取值平均只对应少量哈希
+
+    Returns:
+        tuple: ([(起始位, 位数), ...], 每段的查找半径)
+    """
+    bits = min(24, max(8, math.ceil(math.log2(max(count, 2)))))
+    parts = max(1, round(64 / bits))
+    base, extra = divmod(64, parts)
+    segments = []
+    offset = 0
+    for i in range(parts):
+        width = base + (1 if i < extra else 0)
+        segments.append((offset, width))
+        offset += width
+    return segments, max_distance // parts
+
+
+def _flip_masks(width, radius):
+    """位数为 width、其中不超过 radius 位为 1 的所有掩码"""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(width), r):
+            masks.append(sum(1 << p for p in positions))
+    return masks
+
+
+def hamming_pairs(hashes, max_distance):
+    """
+    查找汉明距离不超过 max_distance 的所有哈希对
+
+    Args:
+        hashes: 64 位哈希值序列
+        max_distance: 最大汉明距离
+
+    Returns:
+        tuple: (i 数组, j 数组)，满足 i < j 且 hashes[i] 与 hashes[j] 的距离不超过 max_distance
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    n = len(hashes)
+    if n < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    segments, radius = _segments(n, max_distance)
+    found_i = []
+    found_j = []
+    for offset, width in segments:
+        keys = ((hashes >> np.uint64(offset)) & np.uint64((1 << width) - 1)).astype(np.int64)
+        order = np.argsort(keys, kind='stable')
+        # 分段位数不超过 24，直接用数组记录每个取值在排序结果中的起始位置和数量
+        bucket_sizes = np.bincount(keys, minlength=1 << width)
+        bucket_starts = np.cumsum(bucket_sizes) - bucket_sizes
+        for mask in _flip_masks(width, radius):
+            for start in range(0, n, QUERY_BLOCK):
+                query = keys[start:start + QUERY_BLOCK] ^ mask
+                lo = bucket_starts[query]
+                counts = bucket_sizes[query]
+                total = int(counts.sum())
+                if not total:
+                    continue
+                # 展开每个查询命中的区间，得到候选对
+                i = np.repeat(np.arange(start, start + len(query)), counts)
+                first = np.repeat(lo - np.cumsum(counts) + counts, counts)
+                j = order[first + np.arange(total)]
+                keep = i < j
+                i, j = i[keep], j[keep]
+                keep = popcount(hashes[i] ^ hashes[j]) <= max_distance
+                found_i.append(i[keep])
+                found_j.append(j[keep])
+
+    if not found_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # 同一对可能在多个分段中被找到，去重
+    pairs = np.unique(np.concatenate(found_i) * n + np.concatenate(found_j))
+    return pairs // n, pairs % n
+
+
+def _connected_components(n, i, j):
+    """根据边 (i, j) 计算连通分量，返回每个节点所在分量的最小节点编号"""
+    labels = np.arange(n)
+    while len(i):
+        li, lj = labels[i], labels[j]
+        if np.array_equal(li, lj):
+            break
+        low = np.minimum(li, lj)
+        # 把两端所在树的根挂到较小的根上，再压缩路径
+        np.minimum.at(labels, li, low)
+        np.minimum.at(labels, lj, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return labels
+
+
+def cluster_hashes(hashes, max_distance):
+    """
+    把哈希按汉明距离聚类（距离不超过 max_distance 的哈希传递地归为一类）
+
+    Returns:
+        numpy.ndarray: 每个哈希所属类别的编号
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    # 完全相同的哈希先合并，避免大量相同图片产生平方级的候选对
+    unique, inverse = np.unique(hashes, return_inverse=True)
+    i, j = hamming_pairs(unique, max_distance)
+    return _connected_components(len(unique), i, j)[inverse.ravel()]
+
+
+def group_similar(paths, hashes, max_distance):
+    """
+    把相似图片分组
+
+    Args:
+        paths: 图片路径列表
+        hashes: 与 paths 一一对应的哈希值
+        max_distance: 最大汉明距离
+
+    Returns:
+        list: 相似图片组（每组为路径列表，按文件大小从大到小排列），按组大小从大到小排序
+    """
+    if len(paths) < 2:
+        return []
+    labels = cluster_hashes(hashes, max_distance)
+    order = np.argsort(labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    groups = []
+    for members in np.split(order, boundaries):
+        if len(members) > 1:
+            group = [paths[k] for k in members]
+            group.sort(key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True)
+            groups.append(group)
+    groups.sort(key=len, reverse=True)
+    return groups
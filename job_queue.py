@@ -0,0 +1,610 @@
+"""
+分布式任务队列模块
+Shared-Filesystem Job Queue Module
+
+把一个任务的文件列表切分为若干分片，保存在多台机器都能访问的共享目录（NFS、SMB 等）中。
+各机器上的工作进程通过独占创建租约文件领取分片，处理期间定时更新租约文件的修改时间作为心跳，
+处理完成后写入分片结果并释放租约。心跳超时的租约视为工作进程已失效，由协调进程（或空闲的
+工作进程）回收，分片重新分配给其他工作进程。协调进程汇总所有分片的结果。
+
+目录结构:
+    <队列目录>/<任务ID>/job.json            任务描述（处理规则、租约超时等），最后写入
+    <队列目录>/<任务ID>/shards/00000.json   分片的文件列表
+    <队列目录>/<任务ID>/leases/00000.lease  租约（领取者信息，修改时间即最近一次心跳）
+    <队列目录>/<任务ID>/results/00000.json  分片结果
+    <队列目录>/<任务ID>/summary.json        协调进程汇总的结果
+
+处理规则与文件夹监控的规则相同（整理、图片转换、文本替换等）。文件路径在所有机器上必须一致
+（相同的挂载点）。工作进程失效时分片可能被部分处理后重新分配，规则应能安全地重复执行。
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+from atomic_io import AtomicWriter, is_temp_path
+from file_processor import FileProcessor
+from folder_watcher import WatchRule, is_ignored
+
+# 每个分片包含的文件数
+DEFAULT_SHARD_SIZE = 200
+
+# 租约超过该时间（秒）没有心跳即视为失效
+LEASE_TIMEOUT = 60.0
+
+# 空闲的工作进程检查新分片的间隔（秒）
+POLL_INTERVAL = 2.0
+
+_CLOCK_FILE = '.clock'
+
+
+def _shard_name(shard):
+    return f"{shard:05d}"
+
+
+def _write_json(path, data, fsync='file'):
+    """原子地写入 JSON 文件"""
+    with AtomicWriter(fsync, preserve_times=False) as writer:
+        writer.write_bytes(path, json.dumps(data, ensure_ascii=False, indent=1).encode('utf-8'))
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _listing(folder, suffix):
+    """目录中以 suffix 结尾的分片编号"""
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return set()
+    return {int(name[:-len(suffix)]) for name in names
+            if name.endswith(suffix) and name[:-len(suffix)].isdigit()}
+
+
+def fs_now(job_dir):
+    """
+    共享文件系统上的当前时间
+
+    租约的心跳时间由文件系统记录（NFS 上为服务器时间），与之比较的"当前时间"也从同一文件系统取得，
+    不受各机器之间时钟偏差的影响。
+    """
+    path = os.path.join(job_dir, _CLOCK_FILE)
+    with open(path, 'a'):
+        pass
+    os.utime(path)
+    return os.stat(path).st_mtime
+
+
+def default_worker_id():
+    """默认的工作进程标识：主机名:进程号"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def submit_job(queue_dir, file_paths, rules, folder=None, shard_size=DEFAULT_SHARD_SIZE,
+               lease_timeout=LEASE_TIMEOUT, job_id=None):
+    """
+    提交任务：把文件列表切分为分片写入共享目录
+
+    Args:
+        queue_dir: 共享的队列目录
+        file_paths: 要处理的文件路径列表（所有机器上路径必须相同）
+        rules: 处理规则（字典列表，格式同文件夹监控配置中的 rules）
+        folder: organize 规则的目标文件夹
+        shard_size: 每个分片的文件数
+        lease_timeout: 租约超时时间（秒）
+        job_id: 任务ID，默认按提交时间生成
+
+    Returns:
+        str: 任务ID
+    """
+    if not rules:
+        raise Exception("任务至少需要一条处理规则")
+    for rule in rules:
+        WatchRule.from_dict(rule)
+    if folder is None and any(rule.get('action') == 'organize' for rule in rules):
+        raise Exception("organize 规则需要指定目标文件夹")
+    if shard_size < 1:
+        raise Exception(f"分片大小必须为正数: {shard_size}")
+
+    job_id = job_id or f"job_{time.strftime('%Y%m%d_%H%M%S')}_{os.urandom(2).hex()}"
+    job_dir = os.path.join(queue_dir, job_id)
+    try:
+        os.makedirs(job_dir)
+    except FileExistsError:
+        raise Exception(f"任务已存在: {job_id}")
+    for sub in ('shards', 'leases', 'results'):
+        os.makedirs(os.path.join(job_dir, sub))
+
+    paths = [os.path.abspath(p) for p in file_paths]
+    shards = 0
+    with AtomicWriter('batch', preserve_times=False) as writer:
+        for start in range(0, len(paths), shard_size):
+            data = json.dumps(paths[start:start + shard_size], ensure_ascii=False).encode('utf-8')
+            writer.write_bytes(os.path.join(job_dir, 'shards', f"{_shard_name(shards)}.json"), data)
+            shards += 1
+
+    # job.json 最后写入，工作进程只会看到分片已全部写好的任务
+    _write_json(os.path.join(job_dir, 'job.json'), {
+        'job_id': job_id,
+        'rules': rules,
+        'folder': os.path.abspath(folder) if folder else None,
+        'shards': shards,
+        'files': len(paths),
+        'lease_timeout': lease_timeout,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    return job_id
+
+
+def load_rules(path):
+    """读取处理规则配置文件（JSON，格式同文件夹监控配置），返回规则字典列表"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        config = json.load(f)
+    return config if isinstance(config, list) else config.get('rules', [])
+
+
+def job_complete(queue_dir, job_id):
+    """任务的所有分片是否都已有结果"""
+    job_dir = os.path.join(queue_dir, job_id)
+    job = _read_json(os.path.join(job_dir, 'job.json'))
+    return len(_listing(os.path.join(job_dir, 'results'), '.json')) >= job['shards']
+
+
+def list_jobs(queue_dir):
+    """队列目录中已提交的任务ID（按名称排序）"""
+    try:
+        names = sorted(os.listdir(queue_dir))
+    except FileNotFoundError:
+        return []
+    return [name for name in names if os.path.exists(os.path.join(queue_dir, name, 'job.json'))]
+
+
+class Lease:
+    """
+    分片租约
+
+    租约文件以 O_CREAT | O_EXCL 独占创建，同一分片同时只有一个工作进程能领取成功
+    （NFSv3 及以上的独占创建是原子的）。文件内容记录领取者和随机令牌，心跳前先确认
+    文件仍属于自己，被回收后心跳失败，工作进程据此放弃该分片。
+    """
+
+    def __init__(self, path, worker_id):
+        self.path = path
+        self.worker_id = worker_id
+        self.token = os.urandom(8).hex()
+
+    @classmethod
+    def claim(cls, job_dir, shard, worker_id):
+        """尝试领取分片，已被领取时返回 None"""
+        lease = cls(os.path.join(job_dir, 'leases', f"{_shard_name(shard)}.lease"), worker_id)
+        try:
+            fd = os.open(lease.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'worker': worker_id, 'token': lease.token,
+                       'claimed': time.strftime('%Y-%m-%d %H:%M:%S')}, f)
+        return lease
+
+    def held(self):
+        """租约文件是否仍属于自己"""
+        try:
+            return _read_json(self.path).get('token') == self.token
+        except (OSError, ValueError):
+            return False
+
+    def heartbeat(self):
+        """更新心跳时间，租约已被回收时返回 False"""
+        if not self.held():
+            return False
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def release(self):
+        if self.held():
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.path)
+
+
+def expire_leases(job_dir, lease_timeout):
+    """
+    回收心跳超时的租约，对应的分片可被重新领取
+
+    Returns:
+        list: 被回收的 (分片编号, 原领取者)
+    """
+    leases_dir = os.path.join(job_dir, 'leases')
+    done = _listing(os.path.join(job_dir, 'results'), '.json')
+    now = fs_now(job_dir)
+    expired = []
+    for shard in sorted(_listing(leases_dir, '.lease')):
+        path = os.path.join(leases_dir, f"{_shard_name(shard)}.lease")
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        # 已有结果的分片：工作进程在写入结果后、释放租约前退出
+        if shard not in done and now - st.st_mtime <= lease_timeout:
+            continue
+
+        # 先改名再删除：改名是原子的，多个进程同时回收时只有一个会成功
+        stale = f"{path}.{os.urandom(4).hex()}.expired"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            continue
+        try:
+            owner = _read_json(stale).get('worker')
+        except (OSError, ValueError):
+            owner = None
+        # 检查与改名之间恰好有一次心跳：租约仍然有效，尽量放回原处（分片已被他人领取时放弃）
+        if shard not in done and now - os.stat(stale).st_mtime <= lease_timeout:
+            with contextlib.suppress(FileExistsError):
+                os.link(stale, path)
+                os.unlink(stale)
+                continue
+        os.unlink(stale)
+        if shard not in done:
+            expired.append((shard, owner))
+    return expired
+
+
+def _merge_counts(total, value):
+    """累加处理器方法的返回值（数量或统计字典）"""
+    if isinstance(value, bool) or value is None:
+        return total
+    if isinstance(value, (int, float)):
+        return (total or 0) + value
+    if isinstance(value, dict):
+        total = dict(total or {})
+        for key, item in value.items():
+            if isinstance(item, (int, float)) and not isinstance(item, bool):
+                total[key] = total.get(key, 0) + item
+        return total
+    return total
+
+
+class JobWorker:
+    """
+    工作进程：不断领取并处理分片，直到没有可领取的分片
+
+    用法:
+        JobWorker('/mnt/share/queue').run(job_id)
+    """
+
+    def __init__(self, queue_dir, worker_id=None, processor=None, heartbeat_interval=None,
+                 poll_interval=POLL_INTERVAL, log=print):
+        self.queue_dir = queue_dir
+        self.worker_id = worker_id or default_worker_id()
+        self.processor = processor or FileProcessor()
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.log = log
+        self.stats = {'shards': 0, 'files': 0, 'errors': 0, 'lost': 0}
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _next_shard(self, job_dir, job):
+        """领取一个尚未完成、未被领取的分片"""
+        done = _listing(os.path.join(job_dir, 'results'), '.json')
+        leased = _listing(os.path.join(job_dir, 'leases'), '.lease')
+        for shard in range(job['shards']):
+            if shard in done or shard in leased:
+                continue
+            lease = Lease.claim(job_dir, shard, self.worker_id)
+            if lease is not None:
+                return shard, lease
+        return None, None
+
+    def _heartbeat(self, lease, interval, lost, finished):
+        while not finished.wait(interval):
+            if not lease.heartbeat():
+                lost.set()
+                return
+
+    def process_shard(self, job_dir, job, shard, lease):
+        """
+        处理一个已领取的分片，逐个文件执行所有规则
+
+        Returns:
+            dict: 分片结果；租约在处理过程中被回收时返回 None
+        """
+        rules = [WatchRule.from_dict(rule) for rule in job['rules']]
+        paths = _read_json(os.path.join(job_dir, 'shards', f"{_shard_name(shard)}.json"))
+        interval = self.heartbeat_interval or max(job['lease_timeout'] / 4, 0.05)
+        lost = threading.Event()
+        finished = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(lease, interval, lost, finished),
+                                daemon=True)
+        beat.start()
+
+        started = time.time()
+        results = [None] * len(rules)
+        errors = []
+        processed = 0
+        try:
+            for path in paths:
+                if lost.is_set() or self._stop.is_set():
+                    return None
+                # 逐个文件调用，单个文件失败不影响分片中的其他文件
+                for k, rule in enumerate(rules):
+                    if not os.path.exists(path) or not rule.matches(path, self.processor):
+                        continue
+                    try:
+                        results[k] = _merge_counts(results[k], rule.apply(self.processor, job['folder'], [path]))
+                    except Exception as e:
+                        errors.append((path, rule.action, str(e)))
+                processed += 1
+        finally:
+            finished.set()
+            beat.join()
+
+        if lost.is_set() or not lease.heartbeat():
+            return None
+        return {
+            'shard': shard,
+            'worker': self.worker_id,
+            'files': len(paths),
+            'processed': processed,
+            'results': [{'action': rule.action, 'result': result} for rule, result in zip(rules, results)],
+            'errors': errors,
+            'started': started,
+            'seconds': time.time() - started,
+        }
+
+    def run_job(self, job_id):
+        """
+        处理指定任务，直到该任务没有可领取的分片
+
+        Returns:
+            int: 本进程完成的分片数
+        """
+        job_dir = os.path.join(self.queue_dir, job_id)
+        job = _read_json(os.path.join(job_dir, 'job.json'))
+        completed = 0
+        while not self._stop.is_set():
+            shard, lease = self._next_shard(job_dir, job)
+            if lease is None:
+                # 没有空闲分片时顺便回收失效的租约，单个工作进程也能完成整个任务
+                if not expire_leases(job_dir, job['lease_timeout']):
+                    break
+                continue
+            try:
+                result = self.process_shard(job_dir, job, shard, lease)
+                if result is None:
+                    self.stats['lost'] += 1
+                    self.log(f"[{self.worker_id}] 分片 {shard} 的租约已失效，放弃")
+                    continue
+                _write_json(os.path.join(job_dir, 'results', f"{_shard_name(shard)}.json"), result)
+            finally:
+                lease.release()
+            completed += 1
+            self.stats['shards'] += 1
+            self.stats['files'] += result['processed']
+            self.stats['errors'] += len(result['errors'])
+            self.log(f"[{self.worker_id}] 完成 {job_id} 分片 {shard}（{result['processed']} 个文件，"
+                     f"{result['seconds']:.1f} 秒）")
+        return completed
+
+    def run(self, job_id=None, exit_when_idle=False):
+        """
+        处理指定任务或队列中的所有任务
+
+        Args:
+            job_id: 任务ID，默认处理队列中所有未完成的任务
+            exit_when_idle: 所有任务都已完成时退出，否则持续等待新任务
+
+        Returns:
+            dict: 统计信息（完成的分片数、文件数、错误数、失去的租约数）
+        """
+        self._stop.clear()
+        while not self._stop.is_set():
+            jobs = [job_id] if job_id else [
+                j for j in list_jobs(self.queue_dir)
+                if not os.path.exists(os.path.join(self.queue_dir, j, 'summary.json'))]
+            if sum(self.run_job(j) for j in jobs):
+                continue
+            # 剩余分片都在其他工作进程手中时继续等待，以便接手其中失效的分片
+            if exit_when_idle and all(job_complete(self.queue_dir, j) for j in jobs):
+                break
+            self._stop.wait(self.poll_interval)
+        return self.stats
+
+
+def job_status(queue_dir, job_id):
+    """
+    任务进度
+
+    Returns:
+        dict: shards（分片总数）、done、leased、pending，以及 leases（分片编号 -> 领取者）
+    """
+    job_dir = os.path.join(queue_dir, job_id)
+    job = _read_json(os.path.join(job_dir, 'job.json'))
+    done = _listing(os.path.join(job_dir, 'results'), '.json')
+    leases = {}
+    for shard in _listing(os.path.join(job_dir, 'leases'), '.lease'):
+        if shard in done:
+            continue
+        try:
+            leases[shard] = _read_json(os.path.join(job_dir, 'leases', f"{_shard_name(shard)}.lease"))['worker']
+        except (OSError, ValueError, KeyError):
+            leases[shard] = None
+    return {
+        'shards': job['shards'],
+        'done': len(done),
+        'leased': len(leases),
+        'pending': job['shards'] - len(done) - len(leases),
+        'leases': leases,
+    }
+
+
+def merge_results(queue_dir, job_id):
+    """
+    汇总所有分片的结果并写入 summary.json
+
+    Returns:
+        dict: files、processed、errors、results（各规则的累计结果）、workers（各工作进程完成的分片数和文件数）
+    """
+    job_dir = os.path.join(queue_dir, job_id)
+    job = _read_json(os.path.join(job_dir, 'job.json'))
+    summary = {
+        'job_id': job_id,
+        'shards': job['shards'],
+        'files': 0,
+        'processed': 0,
+        'errors': [],
+        'results': [{'action': rule['action'], 'result': None} for rule in job['rules']],
+        'workers': {},
+    }
+    first = last = None
+    for shard in sorted(_listing(os.path.join(job_dir, 'results'), '.json')):
+        result = _read_json(os.path.join(job_dir, 'results', f"{_shard_name(shard)}.json"))
+        summary['files'] += result['files']
+        summary['processed'] += result['processed']
+        summary['errors'].extend(result['errors'])
+        for total, item in zip(summary['results'], result['results']):
+            total['result'] = _merge_counts(total['result'], item['result'])
+        worker = summary['workers'].setdefault(result['worker'], {'shards': 0, 'files': 0, 'seconds': 0.0})
+        worker['shards'] += 1
+        worker['files'] += result['processed']
+        worker['seconds'] += result['seconds']
+        first = result['started'] if first is None else min(first, result['started'])
+        end = result['started'] + result['seconds']
+        last = end if last is None else max(last, end)
+    summary['elapsed'] = last - first if first is not None else 0.0
+    _write_json(os.path.join(job_dir, 'summary.json'), summary)
+    return summary
+
+
+def coordinate(queue_dir, job_id, poll_interval=POLL_INTERVAL, timeout=None, log=print):
+    """
+    协调任务：定时回收失效的租约，所有分片完成后汇总结果
+
+    Args:
+        timeout: 最长等待时间（秒），超时仍未完成时抛出异常
+
+    Returns:
+        dict: 汇总结果（同 merge_results）
+    """
+    job_dir = os.path.join(queue_dir, job_id)
+    job = _read_json(os.path.join(job_dir, 'job.json'))
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    reported = None
+    while True:
+        for shard, owner in expire_leases(job_dir, job['lease_timeout']):
+            log(f"工作进程 {owner} 失效，分片 {shard} 重新分配")
+        status = job_status(queue_dir, job_id)
+        progress = (status['done'], status['leased'])
+        if progress != reported:
+            log(f"{job_id}: 完成 {status['done']}/{status['shards']}，处理中 {status['leased']}")
+            reported = progress
+        if status['done'] == status['shards']:
+            return merge_results(queue_dir, job_id)
+        if deadline is not None and time.monotonic() >= deadline:
+            raise Exception(f"任务 {job_id} 在 {timeout} 秒内未完成")
+        time.sleep(poll_interval)
+
+
+def _worker_process(queue_dir, job_id, exit_when_idle):
+    JobWorker(queue_dir).run(job_id, exit_when_idle)
+
+
+def run_local_workers(queue_dir, job_id=None, processes=None, exit_when_idle=True):
+    """在本机启动多个工作进程（模拟多台机器），等待全部结束"""
+    processes = processes or os.cpu_count() or 1
+    workers = [multiprocessing.Process(target=_worker_process, args=(queue_dir, job_id, exit_when_idle))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [worker.exitcode for worker in workers]
+
+
+def _collect_files(folder):
+    paths = []
+    for root, dirs, names in os.walk(folder):
+        dirs[:] = [d for d in dirs if not is_ignored(d)]
+        paths.extend(os.path.join(root, name) for name in names
+                     if not is_ignored(name) and not is_temp_path(name))
+    return sorted(paths)
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="通过共享目录在多台机器上分片处理文件")
+    parser.add_argument('queue', help="共享的队列目录")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit = commands.add_parser('submit', help="提交任务")
+    submit.add_argument('folder', help="要处理的文件夹（递归）")
+    submit.add_argument('--config', help="处理规则配置文件（JSON，格式同文件夹监控）")
+    submit.add_argument('--organize', action='store_true', help="按类型整理文件")
+    submit.add_argument('--convert-images', metavar='FORMAT', help="把图片转换为指定格式")
+    submit.add_argument('--convert-tables', metavar='FORMAT', help="把表格转换为指定格式")
+    submit.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help="每个分片的文件数")
+    submit.add_argument('--lease-timeout', type=float, default=LEASE_TIMEOUT, help="租约超时时间（秒）")
+
+    worker = commands.add_parser('worker', help="启动工作进程")
+    worker.add_argument('--job', help="只处理指定任务")
+    worker.add_argument('--processes', type=int, default=1, help="本机启动的工作进程数")
+    worker.add_argument('--exit-when-idle', action='store_true', help="所有任务完成后退出")
+
+    coordinator = commands.add_parser('coordinate', help="回收失效租约并汇总结果")
+    coordinator.add_argument('job')
+    coordinator.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
+
+    status = commands.add_parser('status', help="查看任务进度")
+    status.add_argument('job', nargs='?')
+    args = parser.parse_args(argv)
+
+    if args.command == 'submit':
+        rules = load_rules(args.config) if args.config else []
+        if args.convert_images:
+            rules.append({'action': 'convert_image', 'target_format': args.convert_images})
+        if args.convert_tables:
+            rules.append({'action': 'convert_table', 'target_format': args.convert_tables})
+        if args.organize:
+            rules.append({'action': 'organize'})
+        job_id = submit_job(args.queue, _collect_files(args.folder), rules, folder=args.folder,
+                            shard_size=args.shard_size, lease_timeout=args.lease_timeout)
+        print(job_id)
+    elif args.command == 'worker':
+        if args.processes > 1:
+            exit_codes = run_local_workers(args.queue, args.job, args.processes, args.exit_when_idle)
+            return 1 if any(exit_codes) else 0
+        try:
+            stats = JobWorker(args.queue).run(args.job, args.exit_when_idle)
+        except KeyboardInterrupt:
+            return 0
+        print(f"完成 {stats['shards']} 个分片、{stats['files']} 个文件，失败 {stats['errors']} 个")
+    elif args.command == 'coordinate':
+        summary = coordinate(args.queue, args.job, args.poll_interval)
+        print(f"共处理 {summary['processed']} 个文件，用时 {summary['elapsed']:.1f} 秒")
+        for name, worker_stats in sorted(summary['workers'].items()):
+            print(f"  {name}: {worker_stats['shards']} 个分片，{worker_stats['files']} 个文件")
+        for path, action, error in summary['errors']:
+            print(f"失败 {path}（{action}）: {error}")
+        return 1 if summary['errors'] else 0
+    else:
+        for job_id in [args.job] if args.job else list_jobs(args.queue):
+            info = job_status(args.queue, job_id)
+            print(f"{job_id}: 完成 {info['done']}/{info['shards']}，处理中 {info['leased']}，"
+                  f"等待 {info['pending']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
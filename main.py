@@ -4,6 +4,7 @@
 Smart File Batch Processor - Main Entry Point
 """
 
+import multiprocessing
 import tkinter as tk
 from gui_interface import FileProcessorGUI
 
@@ -31,4 +32,6 @@ def main():
         input("按回车键退出...")
 
 if __name__ == "__main__":
+    # 打包为 exe 后，多进程计算图片哈希时子进程不会再次启动界面
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,343 @@
+"""
+性能指标采集模块
+Metrics Instrumentation Module
+
+为 FileProcessor 的各项操作提供可选的指标采集：分阶段耗时（读取、转换、编码、写入、fsync）、
+输入/输出字节数以及单文件耗时直方图，可导出为 JSON 或 Prometheus 文本文件格式，
+并可为每个任务保存 cProfile 性能剖析结果。
+
+默认使用 NULL_METRICS，所有采集调用均为空操作，关闭时几乎没有额外开销。
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+# 单文件耗时直方图的桶边界（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """固定桶边界的耗时直方图"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        """记录一次耗时"""
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self):
+        """返回 (上界, 累计数量) 列表，最后一项上界为 +Inf"""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self):
+        return {
+            'buckets': [['+Inf' if b == float('inf') else b, c] for b, c in self.cumulative()],
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+
+class OperationStats:
+    """单个操作的累计统计"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.files = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.phases = {}
+        self.latency = LatencyHistogram()
+
+    def add_phase(self, name, seconds):
+        entry = self.phases.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'files': self.files,
+            'errors': self.errors,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'phases': {name: {'count': c, 'seconds': s} for name, (c, s) in self.phases.items()},
+            'latency': self.latency.to_dict(),
+        }
+
+
+class FileRecord:
+    """单个文件处理过程的记录，由 MetricsRecorder.file() 返回"""
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.outputs = []
+
+    def output(self, path):
+        """登记输出文件，文件处理结束时统计其大小"""
+        self.outputs.append(path)
+
+    def add_bytes_in(self, count):
+        self.bytes_in += count
+
+    def add_bytes_out(self, count):
+        self.bytes_out += count
+
+
+class _NullFileRecord:
+    """关闭采集时使用的空记录"""
+
+    def output(self, path):
+        pass
+
+    def add_bytes_in(self, count):
+        pass
+
+    def add_bytes_out(self, count):
+        pass
+
+
+class NullMetrics:
+    """关闭采集时使用的空实现，所有方法均为空操作"""
+
+    enabled = False
+
+    def __init__(self):
+        self._null = contextlib.nullcontext()
+        self._null_file = contextlib.nullcontext(_NullFileRecord())
+
+    def job(self, operation):
+        return self._null
+
+    def phase(self, name):
+        return self._null
+
+    def file(self, path):
+        return self._null_file
+
+
+NULL_METRICS = NullMetrics()
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class MetricsRecorder:
+    """
+    指标采集器
+
+    用法:
+        recorder = MetricsRecorder(profile_dir='profiles')
+        processor = FileProcessor(metrics=recorder)
+        processor.batch_text_replace(files, 'foo', 'bar')
+        recorder.export_prometheus('sfbp.prom')
+    """
+
+    enabled = True
+
+    def __init__(self, profile_dir=None):
+        """
+        Args:
+            profile_dir: 若指定，则为每个任务保存 cProfile 结果(.prof)到该目录
+        """
+        self.profile_dir = profile_dir
+        self.profiles = []
+        self.operations = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profile_seq = 0
+
+    def _stats(self, operation):
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = OperationStats()
+        return stats
+
+    def _current(self):
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else 'unknown'
+
+    @contextlib.contextmanager
+    def job(self, operation):
+        """记录一次操作调用（一个任务）"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(operation)
+
+        profiler = None
+        if self.profile_dir and len(stack) == 1:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 已有其他剖析器处于活动状态
+                profiler = None
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                self._save_profile(operation, profiler)
+            stack.pop()
+            with self._lock:
+                stats = self._stats(operation)
+                stats.calls += 1
+                stats.seconds += elapsed
+
+    def _save_profile(self, operation, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with self._lock:
+            self._profile_seq += 1
+            seq = self._profile_seq
+        path = os.path.join(self.profile_dir,
+                            f"{operation}_{time.strftime('%Y%m%d_%H%M%S')}_{seq:04d}.prof")
+        profiler.dump_stats(path)
+        self.profiles.append(path)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """记录当前操作中某一阶段的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._stats(self._current()).add_phase(name, elapsed)
+
+    @contextlib.contextmanager
+    def file(self, path):
+        """记录单个文件的处理耗时与输入/输出字节数"""
+        record = FileRecord()
+        record.add_bytes_in(_file_size(path))
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield record
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            for output in record.outputs:
+                record.add_bytes_out(_file_size(output))
+            with self._lock:
+                stats = self._stats(self._current())
+                stats.latency.observe(elapsed)
+                stats.bytes_in += record.bytes_in
+                stats.bytes_out += record.bytes_out
+                if failed:
+                    stats.errors += 1
+                else:
+                    stats.files += 1
+
+    def reset(self):
+        """清空已采集的指标"""
+        with self._lock:
+            self.operations = {}
+            self.profiles = []
+
+    def to_dict(self):
+        """以字典形式返回所有指标"""
+        with self._lock:
+            return {
+                'operations': {name: stats.to_dict() for name, stats in self.operations.items()},
+                'profiles': list(self.profiles),
+            }
+
+    def to_prometheus(self, prefix='sfbp'):
+        """以 Prometheus 文本格式返回所有指标"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}")
+
+        with self._lock:
+            ops = sorted(self.operations.items())
+            metric('operation_calls_total', 'counter', 'Number of operation calls',
+                   [((('operation', op),), s.calls) for op, s in ops])
+            metric('operation_seconds_total', 'counter', 'Total time spent in operations',
+                   [((('operation', op),), s.seconds) for op, s in ops])
+            metric('files_total', 'counter', 'Files processed successfully',
+                   [((('operation', op),), s.files) for op, s in ops])
+            metric('file_errors_total', 'counter', 'Files that failed to process',
+                   [((('operation', op),), s.errors) for op, s in ops])
+            metric('bytes_read_total', 'counter', 'Input bytes',
+                   [((('operation', op),), s.bytes_in) for op, s in ops])
+            metric('bytes_written_total', 'counter', 'Output bytes',
+                   [((('operation', op),), s.bytes_out) for op, s in ops])
+            metric('phase_seconds_total', 'counter', 'Time spent per processing phase',
+                   [((('operation', op), ('phase', ph)), sec)
+                    for op, s in ops for ph, (_, sec) in sorted(s.phases.items())])
+
+            name = f"{prefix}_file_latency_seconds"
+            lines.append(f"# HELP {name} Per-file processing latency")
+            lines.append(f"# TYPE {name} histogram")
+            for op, s in ops:
+                for bound, count in s.latency.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{operation="{op}",le="{le}"}} {count}')
+                lines.append(f'{name}_sum{{operation="{op}"}} {s.latency.sum}')
+                lines.append(f'{name}_count{{operation="{op}"}} {s.latency.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def _write_text(self, path, text):
+        # 先写临时文件再替换，避免采集端读到写了一半的文件
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def export_json(self, path):
+        """导出为JSON文件"""
+        self._write_text(path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+
+    def export_prometheus(self, path):
+        """导出为 Prometheus 文本文件（适用于 node_exporter textfile collector）"""
+        self._write_text(path, self.to_prometheus())
+
+
+def instrumented(func):
+    """装饰 FileProcessor 方法，把整个调用记录为一个任务"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.metrics.job(func.__name__):
+            return func(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,99 @@
+"""
+扫描结果存储模块
+Scan Results Storage Module
+
+以列式结构保存文件夹扫描结果：目录前缀只保存一次，大小和修改时间保存为原始数值数组，
+每个文件只占用一个文件名字符串和若干字节的数值。格式化显示（如 "1.5 MB"）只在真正显示某一行时进行，
+原始数值也可以直接用于排序。
+"""
+
+import os
+from array import array
+
+
+class FileEntry:
+    """单个文件的扫描记录，按需从 ScanResults 中生成"""
+
+    __slots__ = ('name', 'path', 'size', 'modified')
+
+    def __init__(self, name, path, size, modified):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.modified = modified
+
+    def __repr__(self):
+        return f"FileEntry({self.path!r}, size={self.size}, modified={self.modified})"
+
+
+class ScanResults:
+    """
+    列式扫描结果
+
+    用法:
+        results = ScanResults()
+        results.append(folder, name, size, mtime)
+        for i in results.sorted_indices('size', reverse=True)[:100]:
+            entry = results[i]
+    """
+
+    __slots__ = ('dirs', '_dir_ids', 'dir_index', 'names', 'sizes', 'mtimes')
+
+    # 可用于排序的字段
+    SORT_KEYS = ('name', 'size', 'modified', 'path')
+
+    def __init__(self):
+        self.dirs = []
+        self._dir_ids = {}
+        self.dir_index = array('I')
+        self.names = []
+        self.sizes = array('q')
+        self.mtimes = array('d')
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        return FileEntry(self.names[i], self.path(i), self.sizes[i], self.mtimes[i])
+
+    def __iter__(self):
+        for i in range(len(self.names)):
+            yield self[i]
+
+    def append(self, directory, name, size, modified):
+        """添加一条记录，相同目录只保存一次"""
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self.dirs)
+            self.dirs.append(directory)
+        self.dir_index.append(dir_id)
+        self.names.append(name)
+        self.sizes.append(size)
+        self.mtimes.append(modified)
+
+    def path(self, i):
+        """返回第 i 个文件的完整路径"""
+        return os.path.join(self.dirs[self.dir_index[i]], self.names[i])
+
+    def total_size(self):
+        return sum(self.sizes)
+
+    def sorted_indices(self, key='name', reverse=False):
+        """
+        按字段排序并返回行号列表（不复制记录本身）
+
+        Args:
+            key: 'name'、'size'、'modified' 或 'path'
+            reverse: 是否降序
+        """
+        if key == 'name':
+            sort_key = self.names.__getitem__
+        elif key == 'size':
+            sort_key = self.sizes.__getitem__
+        elif key == 'modified':
+            sort_key = self.mtimes.__getitem__
+        elif key == 'path':
+            sort_key = self.path
+        else:
+            raise Exception(f"不支持的排序字段: {key}")
+        return sorted(range(len(self.names)), key=sort_key, reverse=reverse)
@@ -0,0 +1,207 @@
+"""
+表格读写模块
+Table I/O Module
+
+CSV、Excel、Parquet、Feather 之间的格式转换。安装了 pyarrow 时，CSV 由 Arrow 多线程解析，
+超大的 CSV 转为 Parquet/Feather/CSV 时按块流式转换，内存占用与文件大小无关；
+未安装 pyarrow 时自动退回 pandas（Parquet/Feather 格式本身需要 pyarrow）。
+"""
+
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as pa_feather
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pa_parquet
+except ImportError:
+    pa = None
+
+# 目标格式与扩展名
+TABLE_FORMATS = {
+    'xlsx': '.xlsx',
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather',
+}
+
+# 可读取的扩展名与对应的源格式
+SOURCE_FORMATS = {
+    '.csv': 'csv',
+    '.xlsx': 'excel',
+    '.xls': 'excel',
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+}
+
+ENGINES = ('auto', 'pyarrow', 'pandas')
+
+# 超过该大小的 CSV 在输出 Parquet/Feather/CSV 时流式转换
+STREAM_THRESHOLD = 512 * 1024 * 1024
+
+# Arrow 解析 CSV 的块大小，流式转换时列类型由第一块推断
+BLOCK_SIZE = 64 * 1024 * 1024
+
+_UTF8_BOM = b'\xef\xbb\xbf'
+
+
+def has_pyarrow():
+    """是否安装了 pyarrow"""
+    return pa is not None
+
+
+def resolve_engine(engine):
+    """把 'auto' 解析为实际使用的引擎"""
+    if engine not in ENGINES:
+        raise Exception(f"不支持的表格引擎: {engine}")
+    if engine == 'auto':
+        return 'pyarrow' if pa is not None else 'pandas'
+    if engine == 'pyarrow' and pa is None:
+        raise Exception("未安装 pyarrow，请先安装（pip install pyarrow）或使用 pandas 引擎")
+    return engine
+
+
+def source_format(path):
+    """根据扩展名返回源文件格式"""
+    kind = SOURCE_FORMATS.get(os.path.splitext(path)[1].lower())
+    if kind is None:
+        raise Exception(f"不支持的表格文件: {path}")
+    return kind
+
+
+def target_path(path, target_format):
+    """转换后的文件路径（同目录、同名、换扩展名）"""
+    if target_format not in TABLE_FORMATS:
+        raise Exception(f"不支持的目标格式: {target_format}")
+    new_path = os.path.splitext(path)[0] + TABLE_FORMATS[target_format]
+    if os.path.normcase(os.path.abspath(new_path)) == os.path.normcase(os.path.abspath(path)):
+        raise Exception(f"文件已是 {target_format} 格式: {path}")
+    return new_path
+
+
+def _csv_options():
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=BLOCK_SIZE)
+    # 与 pandas 一致，不自动把日期文本解析为时间戳
+    convert_options = pa_csv.ConvertOptions(timestamp_parsers=[])
+    return read_options, convert_options
+
+
+def _text_columns(schema):
+    """
+    Arrow 会把 ISO 格式的日期、时间文本推断为日期/时间类型，pandas 则保留为文本；
+    返回这些列改回文本的类型映射，使两种引擎的转换结果一致
+    """
+    return {field.name: pa.string() for field in schema
+            if pa.types.is_date(field.type) or pa.types.is_time(field.type)}
+
+
+def _read_arrow(path, kind):
+    if kind == 'csv':
+        read_options, convert_options = _csv_options()
+        table = pa_csv.read_csv(path, read_options=read_options, convert_options=convert_options)
+        text_columns = _text_columns(table.schema)
+        if text_columns:
+            table = table.cast(pa.schema([
+                pa.field(f.name, text_columns.get(f.name, f.type)) for f in table.schema]))
+        return table
+    if kind == 'parquet':
+        return pa_parquet.read_table(path)
+    if kind == 'feather':
+        return pa_feather.read_table(path)
+    return pa.Table.from_pandas(pd.read_excel(path), preserve_index=False)
+
+
+def _write_arrow(table, f, target_format):
+    if target_format == 'xlsx':
+        table.to_pandas().to_excel(f, index=False)
+    elif target_format == 'csv':
+        f.write(_UTF8_BOM)
+        pa_csv.write_csv(table, f, pa_csv.WriteOptions(quoting_style='needed'))
+    elif target_format == 'parquet':
+        pa_parquet.write_table(table, f)
+    else:
+        pa_feather.write_feather(table, f)
+
+
+def _read_pandas(path, kind):
+    if kind == 'csv':
+        return pd.read_csv(path)
+    if kind == 'parquet':
+        return pd.read_parquet(path)
+    if kind == 'feather':
+        return pd.read_feather(path)
+    return pd.read_excel(path)
+
+
+def _write_pandas(df, f, target_format):
+    if target_format == 'xlsx':
+        df.to_excel(f, index=False)
+    elif target_format == 'csv':
+        df.to_csv(f, index=False, encoding='utf-8-sig')
+    elif target_format == 'parquet':
+        df.to_parquet(f, index=False)
+    else:
+        df.to_feather(f)
+
+
+def _stream_csv(path, f, target_format):
+    """按块读取 CSV 并逐块写出，不把整个文件载入内存"""
+    read_options, convert_options = _csv_options()
+    reader = pa_csv.open_csv(path, read_options=read_options, convert_options=convert_options)
+    text_columns = _text_columns(reader.schema)
+    if text_columns:
+        reader.close()
+        convert_options.column_types = text_columns
+        reader = pa_csv.open_csv(path, read_options=read_options, convert_options=convert_options)
+
+    if target_format == 'parquet':
+        writer = pa_parquet.ParquetWriter(f, reader.schema)
+    elif target_format == 'feather':
+        # Feather V2 即 Arrow IPC 文件格式，压缩方式与 write_feather 的默认值一致
+        compression = 'lz4' if pa.Codec.is_available('lz4') else None
+        writer = pa_ipc.new_file(f, reader.schema,
+                                 options=pa_ipc.IpcWriteOptions(compression=compression))
+    else:
+        f.write(_UTF8_BOM)
+        writer = pa_csv.CSVWriter(f, reader.schema, pa_csv.WriteOptions(quoting_style='needed'))
+    try:
+        for batch in reader:
+            writer.write_table(pa.Table.from_batches([batch], reader.schema))
+    except pa.ArrowInvalid as e:
+        raise Exception(f"后续数据与首块推断的列类型不一致: {str(e)}")
+    finally:
+        writer.close()
+
+
+def convert_table(path, f, target_format, engine='auto', kind=None):
+    """
+    把表格文件转换为目标格式并写入已打开的二进制文件
+
+    Args:
+        path: 源文件路径（CSV、Excel、Parquet 或 Feather），也可以是已打开的二进制文件对象
+        f: 以二进制写模式打开的目标文件
+        target_format: 'xlsx'、'csv'、'parquet' 或 'feather'
+        engine: 'auto'（有 pyarrow 时使用 pyarrow）、'pyarrow' 或 'pandas'
+        kind: 源文件格式，默认根据扩展名判断（path 为文件对象时必须指定）
+    """
+    if target_format not in TABLE_FORMATS:
+        raise Exception(f"不支持的目标格式: {target_format}")
+    kind = kind or source_format(path)
+    engine = resolve_engine(engine)
+    if pa is None and (target_format in ('parquet', 'feather') or kind in ('parquet', 'feather')):
+        raise Exception("Parquet/Feather 格式需要安装 pyarrow")
+
+    # Excel 只能由 pandas 读取，输出为 Excel/CSV 时经过 Arrow 没有好处
+    if engine == 'pandas' or (kind == 'excel' and target_format in ('xlsx', 'csv')):
+        _write_pandas(_read_pandas(path, kind), f, target_format)
+        return
+
+    if kind == 'csv' and target_format != 'xlsx' and isinstance(path, (str, os.PathLike)) \
+            and os.path.getsize(path) >= STREAM_THRESHOLD:
+        _stream_csv(path, f, target_format)
+        return
+    _write_arrow(_read_arrow(path, kind), f, target_format)
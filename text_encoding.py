@@ -0,0 +1,155 @@
+"""
+文本编码检测模块
+Text Encoding Detection Module
+
+先检查BOM并尝试UTF-8快速解码，只有失败时才对文件开头的一段样本做更耗时的编码推断。
+若安装了 charset_normalizer 或 chardet 会优先使用，否则依次尝试常见中文编码。
+"""
+
+import codecs
+
+# 编码推断时采样的字节数
+SAMPLE_SIZE = 64 * 1024
+
+# 自动检测编码的取值
+AUTO = 'auto'
+
+# BOM 与对应编码；UTF-32 必须排在 UTF-16 之前（UTF-32-LE 的 BOM 以 UTF-16-LE 的 BOM 开头）。
+# UTF-16/32 使用显式字节序的编码，解码后 BOM 以 '\ufeff' 保留在文本开头，写回时原样还原。
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+# 没有第三方检测库时依次尝试的编码，latin-1 可解码任意字节，作为最后的兜底
+FALLBACK_ENCODINGS = ('gbk', 'gb18030', 'big5', 'latin-1')
+
+
+def _load_detector():
+    """返回可用的第三方编码检测函数，没有则返回 None"""
+    try:
+        from charset_normalizer import from_bytes
+
+        def detect(sample):
+            best = from_bytes(sample).best()
+            return best.encoding if best else None
+        return detect
+    except ImportError:
+        pass
+    try:
+        import chardet
+
+        def detect(sample):
+            result = chardet.detect(sample)
+            if result and result.get('confidence', 0) >= 0.5:
+                return result.get('encoding')
+            return None
+        return detect
+    except ImportError:
+        return None
+
+
+_detector = _load_detector()
+
+
+def bom_encoding(data):
+    """根据BOM返回编码，没有BOM返回 None"""
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            return encoding
+    return None
+
+
+def _decodes(data, encoding, final):
+    """判断 data 能否用 encoding 严格解码；final=False 时允许末尾有被截断的多字节字符"""
+    try:
+        codecs.getincrementaldecoder(encoding)('strict').decode(data, final)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
+def detect_encoding(data, sample_size=SAMPLE_SIZE):
+    """
+    检测字节内容的编码
+
+    Args:
+        data: 文件内容（或其开头部分），也可以是 mmap 对象；传入完整内容时
+            样本末尾被截断的多字节字符不会导致误判
+        sample_size: 仅使用前多少字节进行检测
+
+    Returns:
+        str: 编码名称
+    """
+    encoding = bom_encoding(data[:4])
+    if encoding:
+        return encoding
+
+    sample = data[:sample_size]
+    final = len(sample) == len(data)
+    if _decodes(sample, 'utf-8', final):
+        return 'utf-8'
+
+    if _detector:
+        detected = _detector(sample)
+        if detected and _decodes(sample, detected, final):
+            return codecs.lookup(detected).name
+
+    for encoding in FALLBACK_ENCODINGS:
+        if _decodes(sample, encoding, final):
+            return encoding
+    return 'latin-1'
+
+
+def decode_text(data, encoding=AUTO, sample_size=SAMPLE_SIZE):
+    """
+    解码文件内容
+
+    指定编码时严格按该编码解码；encoding='auto' 时先走BOM/UTF-8快速路径，
+    失败后再对样本推断编码，样本推断的编码无法解码全文时改用全文重新推断。
+
+    Args:
+        data: 文件的完整字节内容
+        encoding: 编码名称或 'auto'
+        sample_size: 推断编码时的采样字节数
+
+    Returns:
+        tuple: (文本, 实际使用的编码)
+    """
+    if encoding != AUTO:
+        return data.decode(encoding), encoding
+
+    encoding = bom_encoding(data)
+    if encoding is None:
+        try:
+            return data.decode('utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            encoding = detect_encoding(data, sample_size)
+    try:
+        return data.decode(encoding), encoding
+    except UnicodeDecodeError:
+        encoding = detect_encoding(data, len(data))
+        return data.decode(encoding), encoding
+
+
+def encode_text(text, encoding, source_encoding=None):
+    """
+    编码文本用于写回文件
+
+    转码（encoding 与 source_encoding 不同）时会去掉开头保留的BOM字符，
+    由目标编码自行决定是否写入BOM。
+
+    Args:
+        text: 文本内容
+        encoding: 目标编码
+        source_encoding: 文本原来的编码
+
+    Returns:
+        bytes: 编码后的内容
+    """
+    if source_encoding and encoding != source_encoding and text.startswith('\ufeff'):
+        text = text[1:]
+    return text.encode(encoding)
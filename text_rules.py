@@ -0,0 +1,250 @@
+"""
+多规则文本替换模块
+Multi-Rule Text Rewriting Module
+
+把大量查找/替换规则编译为一次扫描：字面量规则按是否区分大小写分别合并成按前缀树组织的正则表达式
+（效果类似 Aho-Corasick 自动机，同一位置优先匹配最长的字面量），
+正则规则随后按添加顺序在内存中依次执行。每个文件只需读写一次，并统计每条规则的命中次数。
+"""
+
+import csv
+import json
+import os
+import re
+
+from trigram_index import fold_text
+
+
+def _trie_pattern(words):
+    """把一组字面量编译为前缀树形式的正则表达式，同一位置优先匹配更长的字面量"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        parts = []
+        # 没有分叉的链直接拼接，避免逐字符递归
+        while True:
+            keys = [k for k in node if k]
+            if len(keys) == 1 and '' not in node:
+                parts.append(re.escape(keys[0]))
+                node = node[keys[0]]
+                continue
+            break
+        branches = [re.escape(k) + build(node[k]) for k in sorted(k for k in node if k)]
+        if branches:
+            group = '(?:' + '|'.join(branches) + ')'
+            parts.append(group + '?' if '' in node else group)
+        return ''.join(parts)
+
+    return build(trie)
+
+
+def _fold_key(text):
+    """
+    逐字符折叠为正则 IGNORECASE 视为等价的代表字符，长度不变
+
+    不区分大小写的字面量按折叠后的形式建前缀树，同一节点的分支互不重叠，
+    否则 'A…' 与 'a…' 两个分支会按排序先后尝试，破坏最长匹配。
+    """
+    chars = []
+    for ch in text:
+        folded = fold_text(ch)
+        chars.append(folded if len(folded) == 1 else ch)
+    return ''.join(chars)
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', '是')
+
+
+class TextRule:
+    """单条替换规则"""
+
+    def __init__(self, find_text, replace_text, use_regex=False, case_sensitive=True):
+        if not find_text:
+            raise Exception("查找内容不能为空")
+        self.find_text = find_text
+        self.replace_text = replace_text
+        self.use_regex = use_regex
+        self.case_sensitive = case_sensitive
+
+    def __repr__(self):
+        kind = 'regex' if self.use_regex else 'literal'
+        return f"TextRule({kind}, {self.find_text!r} -> {self.replace_text!r})"
+
+
+class TextRuleSet:
+    """
+    替换规则集
+
+    字面量规则在一次扫描中同时替换，替换结果不会再被其他字面量规则匹配；
+    同一位置有多个字面量可以匹配时（无论是否区分大小写）取最长的一个，
+    长度相同（如大小写不同的同一字面量）时以先添加的规则为准。
+    正则规则在字面量替换之后按添加顺序依次执行，替换文本支持 \\1 等分组引用。
+    """
+
+    def __init__(self, rules=None):
+        self.rules = []
+        self._compiled = None
+        for rule in rules or []:
+            self.add_rule(rule)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def add_rule(self, rule):
+        self.rules.append(rule)
+        self._compiled = None
+        return len(self.rules) - 1
+
+    def add(self, find_text, replace_text, use_regex=False, case_sensitive=True):
+        """
+        添加一条规则
+
+        Returns:
+            int: 规则序号（对应命中次数列表中的位置）
+        """
+        return self.add_rule(TextRule(find_text, replace_text, use_regex, case_sensitive))
+
+    @classmethod
+    def from_pairs(cls, pairs, use_regex=False, case_sensitive=True):
+        """由 (查找, 替换) 列表创建规则集"""
+        rule_set = cls()
+        for find_text, replace_text in pairs:
+            rule_set.add(find_text, replace_text, use_regex, case_sensitive)
+        return rule_set
+
+    @classmethod
+    def load(cls, path):
+        """
+        从规则文件加载
+
+        支持 JSON（对象列表）和 CSV（带表头），字段为 find、replace，
+        可选 regex、case_sensitive（默认分别为否、是）。
+        """
+        if os.path.splitext(path)[1].lower() == '.json':
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                rows = json.load(f)
+        else:
+            with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                rows = list(csv.DictReader(f))
+
+        rule_set = cls()
+        for i, row in enumerate(rows, 1):
+            if 'find' not in row:
+                raise Exception(f"规则文件第 {i} 条缺少 find 字段")
+            rule_set.add(
+                row['find'], row.get('replace') or '',
+                _parse_bool(row.get('regex', False)),
+                _parse_bool(row.get('case_sensitive', True)),
+            )
+        return rule_set
+
+    def _compile(self):
+        if self._compiled is not None:
+            return self._compiled
+
+        exact = {}
+        folded = {}
+        for index, rule in enumerate(self.rules):
+            if rule.use_regex:
+                continue
+            if rule.case_sensitive:
+                exact.setdefault(rule.find_text, index)
+            else:
+                folded.setdefault(_fold_key(rule.find_text), index)
+
+        exact_pattern = re.compile(_trie_pattern(exact)) if exact else None
+        folded_pattern = re.compile(f"(?i:{_trie_pattern(folded)})") if folded else None
+
+        regex_rules = []
+        for index, rule in enumerate(self.rules):
+            if rule.use_regex:
+                flags = 0 if rule.case_sensitive else re.IGNORECASE
+                try:
+                    regex_rules.append((index, re.compile(rule.find_text, flags), rule.replace_text))
+                except re.error as e:
+                    raise Exception(f"正则表达式 {rule.find_text} 无效: {str(e)}")
+
+        self._compiled = (exact_pattern, folded_pattern, exact, folded, regex_rules)
+        return self._compiled
+
+    @staticmethod
+    def _literal_matches(text, exact_pattern, exact, folded_pattern, folded):
+        """
+        依次产出不重叠的字面量匹配 (起点, 终点, 规则序号)
+
+        区分与不区分大小写的两棵前缀树分别查找，同一起点取较长的匹配，长度相同取先添加的规则。
+        """
+        searches = []
+        if exact_pattern is not None:
+            searches.append((exact_pattern, lambda m: exact[m.group()]))
+        if folded_pattern is not None:
+            searches.append((folded_pattern, lambda m: folded[_fold_key(m.group())]))
+
+        pending = [pattern.search(text) for pattern, _ in searches]
+        pos = 0
+        while True:
+            best = None
+            for k, ((pattern, lookup), match) in enumerate(zip(searches, pending)):
+                # 与上一个已替换片段重叠的匹配需要从新位置重新查找
+                if match is not None and match.start() < pos:
+                    match = pending[k] = pattern.search(text, pos)
+                if match is None:
+                    continue
+                candidate = (match.start(), -match.end(), lookup(match))
+                if best is None or candidate < best:
+                    best = candidate
+            if best is None:
+                return
+            start, end, index = best[0], -best[1], best[2]
+            yield start, end, index
+            pos = end
+
+    def apply(self, text):
+        """
+        对文本执行所有规则
+
+        Returns:
+            tuple: (替换后的文本, 每条规则命中次数的列表)
+        """
+        exact_pattern, folded_pattern, exact, folded, regex_rules = self._compile()
+        hits = [0] * len(self.rules)
+
+        if exact_pattern is None or folded_pattern is None:
+            # 只有一棵前缀树时，同一节点的分支互不重叠，正则本身就是最长匹配
+            pattern = exact_pattern or folded_pattern
+            if pattern is not None:
+                lookup = (lambda s: exact[s]) if exact_pattern is not None else \
+                    (lambda s: folded[_fold_key(s)])
+
+                def replace(match):
+                    index = lookup(match.group())
+                    hits[index] += 1
+                    return self.rules[index].replace_text
+
+                text = pattern.sub(replace, text)
+        else:
+            parts = []
+            last = 0
+            for start, end, index in self._literal_matches(text, exact_pattern, exact,
+                                                           folded_pattern, folded):
+                parts.append(text[last:start])
+                parts.append(self.rules[index].replace_text)
+                hits[index] += 1
+                last = end
+            if parts:
+                parts.append(text[last:])
+                text = ''.join(parts)
+
+        for index, pattern, replace_text in regex_rules:
+            text, count = pattern.subn(replace_text, text)
+            hits[index] += count
+
+        return text, hits
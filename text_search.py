@@ -0,0 +1,225 @@
+"""
+文本搜索预览模块
+Text Search Preview Module
+
+只读地并行扫描文件，统计每个文件的匹配次数并返回有限数量的上下文片段，用于替换前预览。
+每个文件达到匹配上限后立即停止；大文件在可以按字节匹配时使用内存映射读取，
+不必把整个文件解码到内存中。
+"""
+
+import mmap
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from text_encoding import AUTO, SAMPLE_SIZE, decode_text, detect_encoding
+
+# 超过该大小的文件尝试使用内存映射按字节匹配
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+# 可以直接按字节匹配的编码（UTF-8 为自同步编码，字节匹配不会落在字符中间）
+_BYTE_SAFE_ENCODINGS = ('utf-8', 'utf-8-sig', 'ascii')
+
+# 不区分大小写时还会匹配非ASCII字符的ASCII字母（如 K 与开尔文符号 K、s 与 ſ、i 与 İ、ı），按字节匹配会漏掉这些匹配
+_UNICODE_CASE_LETTERS = frozenset('iksIKS')
+
+# 统计换行数时每次从内存映射中复制的字节数
+_COUNT_CHUNK = 1024 * 1024
+
+
+class SearchQuery:
+    """一次搜索的查找条件"""
+
+    def __init__(self, find_text, replace_text=None, case_sensitive=False, use_regex=False):
+        if not find_text:
+            raise Exception("查找内容不能为空")
+        self.find_text = find_text
+        self.replace_text = replace_text
+        self.case_sensitive = case_sensitive
+        self.use_regex = use_regex
+
+        flags = 0 if case_sensitive else re.IGNORECASE
+        source = find_text if use_regex else re.escape(find_text)
+        try:
+            self.pattern = re.compile(source, flags)
+        except re.error as e:
+            raise Exception(f"正则表达式 {find_text} 无效: {str(e)}")
+
+    def bytes_pattern(self, encoding):
+        """
+        返回可直接用于原始字节的正则表达式，无法保证与文本匹配结果一致时返回 None
+
+        仅支持 UTF-8 文件中的字面量查找；不区分大小写时要求查找内容为ASCII，
+        且不含 i、k、s（这些字母还与非ASCII字符大小写对应）。
+        """
+        if self.use_regex or encoding not in _BYTE_SAFE_ENCODINGS:
+            return None
+        if not self.case_sensitive and (not self.find_text.isascii() or
+                                        _UNICODE_CASE_LETTERS.intersection(self.find_text)):
+            return None
+        flags = 0 if self.case_sensitive else re.IGNORECASE
+        return re.compile(re.escape(self.find_text.encode('utf-8')), flags)
+
+    def replacement(self, match):
+        """返回某个匹配项替换后的文本"""
+        if self.replace_text is None:
+            return None
+        if self.use_regex:
+            return match.expand(self.replace_text)
+        return self.replace_text
+
+
+def _snippet(text, start, end, context):
+    """截取匹配项所在行的上下文"""
+    line_start = max(text.rfind('\n', 0, start) + 1, start - context)
+    line_end = text.find('\n', end)
+    if line_end == -1:
+        line_end = len(text)
+    line_end = min(line_end, end + context)
+    return text[line_start:start], text[start:end], text[end:line_end]
+
+
+def _search_text(text, query, max_matches, max_snippets, context):
+    matches = 0
+    snippets = []
+    line = 1
+    line_pos = 0
+    for match in query.pattern.finditer(text):
+        if matches >= max_matches:
+            return matches, snippets, True
+        matches += 1
+        if len(snippets) < max_snippets:
+            line += text.count('\n', line_pos, match.start())
+            line_pos = match.start()
+            before, matched, after = _snippet(text, match.start(), match.end(), context)
+            snippets.append({
+                'line': line,
+                'before': before,
+                'match': matched,
+                'after': after,
+                'replacement': query.replacement(match),
+            })
+    return matches, snippets, False
+
+
+def _count_newlines(data, start, end):
+    """分块统计内存映射中 [start, end) 的换行数，避免一次复制整段数据"""
+    count = 0
+    while start < end:
+        stop = min(start + _COUNT_CHUNK, end)
+        count += data[start:stop].count(b'\n')
+        start = stop
+    return count
+
+
+def _search_mmap(data, pattern, query, encoding, max_matches, max_snippets, context):
+    matches = 0
+    snippets = []
+    line = 1
+    line_pos = 0
+    byte_context = context * 4
+    for match in pattern.finditer(data):
+        if matches >= max_matches:
+            return matches, snippets, True
+        matches += 1
+        if len(snippets) < max_snippets:
+            start, end = match.start(), match.end()
+            line += _count_newlines(data, line_pos, start)
+            line_pos = start
+            # 截取时多取一些字节，解码后再按字符数裁剪
+            chunk_start = max(0, start - byte_context)
+            chunk = data[chunk_start:end + byte_context].decode(encoding, errors='replace')
+            prefix_len = len(data[chunk_start:start].decode(encoding, errors='replace'))
+            matched = match.group().decode(encoding, errors='replace')
+            before, matched, after = _snippet(chunk, prefix_len, prefix_len + len(matched), context)
+            snippets.append({
+                'line': line,
+                'before': before,
+                'match': matched,
+                'after': after,
+                'replacement': query.replace_text,
+            })
+    return matches, snippets, False
+
+
+def search_file(file_path, query, encoding=AUTO, max_matches=1000, max_snippets=3, context=40,
+                mmap_threshold=MMAP_THRESHOLD):
+    """
+    在单个文件中搜索
+
+    Args:
+        file_path: 文件路径
+        query: SearchQuery
+        encoding: 文件编码，'auto' 表示自动检测
+        max_matches: 匹配计数上限，达到后停止扫描该文件
+        max_snippets: 最多返回的上下文片段数
+        context: 片段中匹配项前后保留的字符数
+        mmap_threshold: 超过该大小的文件尝试内存映射
+
+    Returns:
+        dict: path、matches、truncated(是否因达到上限而提前停止)、encoding、snippets、error
+    """
+    result = {'path': file_path, 'matches': 0, 'truncated': False,
+              'encoding': None, 'snippets': [], 'error': None}
+    try:
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return result
+
+            if size >= mmap_threshold:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    file_encoding = encoding
+                    if file_encoding == AUTO:
+                        # 传入整个映射，样本末尾被截断的多字节字符不会被当作非法字节
+                        file_encoding = detect_encoding(data, SAMPLE_SIZE)
+                    pattern = query.bytes_pattern(file_encoding)
+                    if pattern is not None:
+                        result['encoding'] = file_encoding
+                        result['matches'], result['snippets'], result['truncated'] = _search_mmap(
+                            data, pattern, query, file_encoding, max_matches, max_snippets, context)
+                        return result
+                    raw = data[:]
+            else:
+                raw = f.read()
+
+        text, result['encoding'] = decode_text(raw, encoding)
+        del raw
+        result['matches'], result['snippets'], result['truncated'] = _search_text(
+            text, query, max_matches, max_snippets, context)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def search_files(file_paths, query, encoding=AUTO, max_workers=None, **options):
+    """
+    并行搜索多个文件，按完成顺序逐个产出结果
+
+    同时在途的任务数量有上限，即使文件数量很多也不会一次性提交全部任务。
+
+    Args:
+        file_paths: 文件路径列表
+        query: SearchQuery
+        encoding: 文件编码，'auto' 表示自动检测
+        max_workers: 线程数，默认按CPU数量确定
+        **options: 传给 search_file 的其他参数
+
+    Yields:
+        dict: 单个文件的搜索结果，见 search_file
+    """
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+    paths = iter(file_paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for path in paths:
+            pending.add(executor.submit(search_file, path, query, encoding, **options))
+            if len(pending) >= max_workers * 4:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                path = next(paths, None)
+                if path is not None:
+                    pending.add(executor.submit(search_file, path, query, encoding, **options))
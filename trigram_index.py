@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+三元组内容索引模块
+Trigram Content Index Module
+
+为文件夹中的文本文件建立持久化的三元组(trigram)索引，在替换或预览之前快速筛选出
+可能包含查找内容的文件，其余文件无需打开。
+
+- 索引保存在 SQLite 数据库中，每次刷新只重新索引大小、修改时间或 inode 发生变化的文件
+- 每次刷新写入一个新的倒排表分段（按三元组存放压缩的文件ID数组），分段过多时自动合并
+- 文本统一按小写折叠后索引，因此区分/不区分大小写的查找都可使用；筛选结果是可能匹配文件的超集
+- 二进制文件、过大的文件和新出现但尚未刷新的文件总是作为候选文件返回
+
+用法:
+    python trigram_index.py 文件夹 --refresh
+    python trigram_index.py 文件夹 --search "查找内容"
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from atomic_io import is_temp_path
+from text_encoding import decode_text
+
+# 默认建立索引的文本文件扩展名
+TEXT_EXTENSIONS = {
+    '.txt', '.md', '.rst', '.log', '.csv', '.tsv', '.json', '.xml', '.yaml', '.yml', '.toml',
+    '.ini', '.conf', '.cfg', '.properties', '.sql', '.html', '.htm', '.css', '.js', '.jsx',
+    '.ts', '.tsx', '.vue', '.py', '.java', '.c', '.h', '.cpp', '.hpp', '.cs', '.go', '.rs',
+    '.php', '.rb', '.sh', '.bat',
+}
+
+# 超过该大小的文件不建立索引（总是作为候选文件）
+MAX_FILE_SIZE = 16 * 1024 * 1024
+
+# 单个分段最多包含的文件数，限制刷新时的内存占用
+SEGMENT_FILES = 10000
+
+# 分段数量超过该值时自动合并
+MAX_SEGMENTS = 8
+
+# 文件状态：已索引 / 未索引（二进制、过大或读取失败）
+STATUS_INDEXED = 1
+STATUS_SKIPPED = 0
+
+# 正则表达式 IGNORECASE 视为等价、但 str.lower() 不会统一的字符组（与 re 模块的额外大小写规则一致），
+# 折叠到组内第一个字符；U+0307 为 'İ'.lower() 产生的组合点，去掉后与正则的简单大小写映射一致
+_CASE_EQUIVALENCES = (
+    (0x69, 0x131), (0x73, 0x17f), (0xb5, 0x3bc), (0x345, 0x3b9, 0x1fbe), (0x390, 0x1fd3),
+    (0x3b0, 0x1fe3), (0x3b2, 0x3d0), (0x3b5, 0x3f5), (0x3b8, 0x3d1), (0x3ba, 0x3f0),
+    (0x3c0, 0x3d6), (0x3c1, 0x3f1), (0x3c2, 0x3c3), (0x3c6, 0x3d5), (0x432, 0x1c80),
+    (0x434, 0x1c81), (0x43e, 0x1c82), (0x441, 0x1c83), (0x442, 0x1c84, 0x1c85), (0x44a, 0x1c86),
+    (0x463, 0x1c87), (0x1c88, 0xa64b), (0x1e61, 0x1e9b), (0xfb05, 0xfb06),
+)
+_FOLD_TABLE = {cp: group[0] for group in _CASE_EQUIVALENCES for cp in group[1:]}
+_FOLD_TABLE[0x307] = None
+
+
+def fold_text(text):
+    """索引与查询共用的大小写折叠"""
+    return text.lower().translate(_FOLD_TABLE)
+
+
+def trigrams_of(data):
+    """返回字节串中所有不重复三元组（24位整数）组成的有序数组"""
+    if len(data) < 3:
+        return np.empty(0, dtype=np.uint32)
+    arr = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+    return np.unique((arr[:-2] << 16) | (arr[1:-1] << 8) | arr[2:])
+
+
+def _skip_class(pattern, i):
+    """跳过从 pattern[i]=='[' 开始的字符类，返回其后的位置"""
+    i += 1
+    if i < len(pattern) and pattern[i] == '^':
+        i += 1
+    if i < len(pattern) and pattern[i] == ']':
+        i += 1
+    while i < len(pattern) and pattern[i] != ']':
+        i += 2 if pattern[i] == '\\' else 1
+    return i + 1
+
+
+# 只匹配字符类或位置、不代表具体字符的单字母转义
+_CLASS_ESCAPES = set('dDwWsSbBAZ')
+
+
+def required_literals(pattern):
+    """
+    提取正则表达式中任何匹配都必须包含的字面量片段
+
+    只分析最外层的顺序结构，分组、字符类、转义类和被量词修饰的字符都视为断点；
+    无法确定时返回空列表（表示不做筛选）。
+    """
+    try:
+        if re.compile(pattern).flags & re.VERBOSE:
+            return []
+    except re.error:
+        return []
+
+    literals = []
+    current = []
+
+    def flush():
+        if current:
+            literals.append(''.join(current))
+            current.clear()
+
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        char = None
+        if c == '\\':
+            nxt = pattern[i + 1] if i + 1 < n else ''
+            if nxt in _CLASS_ESCAPES:
+                flush()
+            elif nxt.isalnum() or not nxt:
+                # \x41、\u4e2d、\N{...}、\101、\n、反向引用等长度不定或代表其他字符，放弃筛选
+                return []
+            else:
+                char = nxt
+            i += 2
+        elif c == '[':
+            flush()
+            i = _skip_class(pattern, i)
+        elif c == '(':
+            flush()
+            depth = 0
+            while i < n:
+                if pattern[i] == '\\':
+                    i += 2
+                    continue
+                if pattern[i] == '[':
+                    i = _skip_class(pattern, i)
+                    continue
+                if pattern[i] == '(':
+                    depth += 1
+                elif pattern[i] == ')':
+                    depth -= 1
+                    if depth == 0:
+                        i += 1
+                        break
+                i += 1
+        elif c == '|':
+            return []
+        elif c in '.^$':
+            flush()
+            i += 1
+        else:
+            char = c
+            i += 1
+
+        # 处理量词：可选的量词去掉前一个字符，任何量词都截断连续片段
+        if i < n and pattern[i] in '*+?{':
+            quantifier = pattern[i]
+            if char is not None and quantifier != '+':
+                char = None
+            if char is not None:
+                current.append(char)
+            flush()
+            if quantifier == '{':
+                end = pattern.find('}', i)
+                i = end + 1 if end != -1 else i + 1
+            else:
+                i += 1
+            if i < n and pattern[i] in '?+':
+                i += 1
+            continue
+
+        if char is not None:
+            current.append(char)
+    flush()
+    return literals
+
+
+def query_trigrams(find_text, use_regex=False):
+    """返回查找内容对应的必需三元组数组，无法筛选时返回 None"""
+    literals = required_literals(find_text) if use_regex else [find_text]
+    arrays = [trigrams_of(fold_text(lit).encode('utf-8')) for lit in literals]
+    arrays = [a for a in arrays if len(a)]
+    if not arrays:
+        return None
+    return np.unique(np.concatenate(arrays))
+
+
+def default_index_path(folder):
+    """默认索引文件位置（用户目录下，避免被整理等操作移动）"""
+    digest = hashlib.sha1(os.path.abspath(folder).encode('utf-8')).hexdigest()[:16]
+    return str(Path.home() / '.smart_file_processor' / 'index' / f"{digest}.sqlite")
+
+
+def _encode_ids(ids):
+    return zlib.compress(np.asarray(ids, dtype=np.uint32).tobytes(), 1)
+
+
+def _decode_ids(blob):
+    return np.frombuffer(zlib.decompress(blob), dtype=np.uint32)
+
+
+class TrigramIndex:
+    """
+    文件夹三元组索引
+
+    用法:
+        with TrigramIndex(folder) as index:
+            index.refresh()
+            files = index.candidates(all_files, "查找内容")
+    """
+
+    def __init__(self, folder, index_path=None, extensions=None, max_file_size=MAX_FILE_SIZE):
+        self.folder = os.path.abspath(folder)
+        if not os.path.isdir(self.folder):
+            raise Exception(f"文件夹不存在: {folder}")
+        self.index_path = index_path or default_index_path(self.folder)
+        self.extensions = {e.lower() for e in extensions} if extensions else TEXT_EXTENSIONS
+        self.max_file_size = max_file_size
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.index_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                status INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                trigram INTEGER NOT NULL,
+                segment INTEGER NOT NULL,
+                ids BLOB NOT NULL,
+                PRIMARY KEY (trigram, segment)
+            ) WITHOUT ROWID;
+        """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self.conn.close()
+
+    def _walk(self):
+        """遍历文件夹中需要索引的文件，产出 (路径, stat)"""
+        index_file = os.path.abspath(self.index_path)
+        stack = [self.folder]
+        while stack:
+            folder = stack.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if os.path.splitext(entry.name)[1].lower() not in self.extensions:
+                    continue
+                if is_temp_path(entry.path) or entry.path.startswith(index_file):
+                    continue
+                try:
+                    yield entry.path, entry.stat()
+                except OSError:
+                    continue
+
+    def _extract(self, path, size):
+        """读取文件并提取三元组，无法索引时返回 None"""
+        if size > self.max_file_size:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if b'\0' in data[:8192] and not data.startswith((b'\xff\xfe', b'\xfe\xff')):
+            return None
+        try:
+            text, _ = decode_text(data)
+        except (UnicodeDecodeError, LookupError):
+            return None
+        return trigrams_of(fold_text(text).encode('utf-8'))
+
+    def _next_segment(self):
+        row = self.conn.execute("SELECT MAX(segment) FROM postings").fetchone()
+        return (row[0] or 0) + 1
+
+    def _write_segment(self, segment, entries):
+        """把 [(文件ID, 三元组数组)] 写入一个新分段"""
+        entries = [(fid, tri) for fid, tri in entries if len(tri)]
+        if not entries:
+            return
+        trigrams = np.concatenate([tri for _, tri in entries])
+        ids = np.concatenate([np.full(len(tri), fid, dtype=np.uint32) for fid, tri in entries])
+        order = np.lexsort((ids, trigrams))
+        trigrams = trigrams[order]
+        ids = ids[order]
+        unique, starts = np.unique(trigrams, return_index=True)
+        bounds = list(starts[1:]) + [len(ids)]
+        self.conn.executemany(
+            "INSERT INTO postings (trigram, segment, ids) VALUES (?, ?, ?)",
+            ((int(t), segment, _encode_ids(ids[s:e])) for t, s, e in zip(unique, starts, bounds)))
+
+    def refresh(self, max_workers=None):
+        """
+        增量刷新索引，只处理新增、修改和删除的文件
+
+        Args:
+            max_workers: 读取文件的线程数
+
+        Returns:
+            dict: indexed(重新索引)、skipped(无法索引)、unchanged、removed 数量
+        """
+        existing = {}
+        for fid, path, size, mtime_ns, inode in self.conn.execute(
+                "SELECT id, path, size, mtime_ns, inode FROM files"):
+            existing[path] = (fid, size, mtime_ns, inode)
+
+        changed = []
+        unchanged = 0
+        for path, st in self._walk():
+            old = existing.pop(path, None)
+            if old and old[1:] == (st.st_size, st.st_mtime_ns, st.st_ino):
+                unchanged += 1
+                continue
+            changed.append((path, st, old[0] if old else None))
+
+        stats = {'indexed': 0, 'skipped': 0, 'unchanged': unchanged, 'removed': len(existing)}
+        max_workers = max_workers or min(16, (os.cpu_count() or 1) * 2)
+
+        with self.conn:
+            # 删除已不存在或已变化的文件记录，旧分段中残留的ID在查询时会被过滤掉
+            stale_ids = [v[0] for v in existing.values()] + [old for _, _, old in changed if old]
+            for i in range(0, len(stale_ids), 900):
+                chunk = stale_ids[i:i + 900]
+                self.conn.execute(
+                    f"DELETE FROM files WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for i in range(0, len(changed), SEGMENT_FILES):
+                batch = changed[i:i + SEGMENT_FILES]
+                extracted = executor.map(lambda item: self._extract(item[0], item[1].st_size), batch)
+                entries = []
+                with self.conn:
+                    segment = self._next_segment()
+                    for (path, st, _), trigrams in zip(batch, extracted):
+                        status = STATUS_SKIPPED if trigrams is None else STATUS_INDEXED
+                        cursor = self.conn.execute(
+                            "INSERT INTO files (path, size, mtime_ns, inode, status) VALUES (?, ?, ?, ?, ?)",
+                            (path, st.st_size, st.st_mtime_ns, st.st_ino, status))
+                        if trigrams is None:
+                            stats['skipped'] += 1
+                        else:
+                            entries.append((cursor.lastrowid, trigrams))
+                            stats['indexed'] += 1
+                    self._write_segment(segment, entries)
+
+        segments = self.conn.execute("SELECT COUNT(DISTINCT segment) FROM postings").fetchone()[0]
+        if segments > MAX_SEGMENTS:
+            self.compact()
+        return stats
+
+    def compact(self):
+        """合并所有分段，并清除已删除文件的残留ID"""
+        live = np.array([row[0] for row in self.conn.execute("SELECT id FROM files")], dtype=np.uint32)
+        live.sort()
+        with self.conn:
+            merged = []
+            current = None
+            parts = []
+            for trigram, blob in self.conn.execute(
+                    "SELECT trigram, ids FROM postings ORDER BY trigram, segment"):
+                if trigram != current:
+                    if parts:
+                        merged.append((current, parts))
+                    current, parts = trigram, []
+                parts.append(_decode_ids(blob))
+            if parts:
+                merged.append((current, parts))
+
+            self.conn.execute("DELETE FROM postings")
+            rows = []
+            for trigram, parts in merged:
+                ids = np.concatenate(parts)
+                ids = ids[np.isin(ids, live, assume_unique=True)]
+                if len(ids):
+                    rows.append((trigram, 1, _encode_ids(np.sort(ids))))
+            self.conn.executemany("INSERT INTO postings (trigram, segment, ids) VALUES (?, ?, ?)", rows)
+        self.conn.execute("VACUUM")
+
+    def _matching_ids(self, trigrams):
+        """返回包含所有给定三元组的文件ID（可能含已删除的ID）"""
+        postings = []
+        for trigram in trigrams:
+            blobs = self.conn.execute(
+                "SELECT ids FROM postings WHERE trigram = ?", (int(trigram),)).fetchall()
+            if not blobs:
+                return np.empty(0, dtype=np.uint32)
+            postings.append(np.concatenate([_decode_ids(b[0]) for b in blobs]))
+        # 从最短的倒排表开始求交集
+        postings.sort(key=len)
+        result = np.unique(postings[0])
+        for ids in postings[1:]:
+            result = np.intersect1d(result, ids)
+            if not len(result):
+                break
+        return result
+
+    def search(self, find_text, use_regex=False):
+        """
+        返回索引中可能包含查找内容的文件路径集合（含无法索引的文件）
+
+        Returns:
+            set 或 None: 无法用索引筛选时返回 None
+        """
+        trigrams = query_trigrams(find_text, use_regex)
+        if trigrams is None:
+            return None
+
+        ids = [int(i) for i in self._matching_ids(trigrams)]
+        paths = set()
+        for i in range(0, len(ids), 900):
+            chunk = ids[i:i + 900]
+            paths.update(row[0] for row in self.conn.execute(
+                f"SELECT path FROM files WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        paths.update(row[0] for row in self.conn.execute(
+            "SELECT path FROM files WHERE status = ?", (STATUS_SKIPPED,)))
+        return paths
+
+    def candidates(self, file_paths, find_text, use_regex=False):
+        """
+        从给定文件中筛选可能包含查找内容的文件，保持原有顺序
+
+        不在索引中的文件（如刷新后新增的文件）以及刷新后被修改过的文件总是保留。
+
+        Returns:
+            list: 候选文件路径
+        """
+        return self.candidates_any(file_paths, [(find_text, use_regex)])
+
+    def candidates_any(self, file_paths, queries):
+        """
+        从给定文件中筛选可能包含任意一个查找内容的文件（用于多规则替换）
+
+        Args:
+            file_paths: 文件路径列表
+            queries: (查找内容, 是否正则) 列表
+
+        Returns:
+            list: 候选文件路径
+        """
+        matched = set()
+        for find_text, use_regex in queries:
+            paths = self.search(find_text, use_regex)
+            if paths is None:
+                return list(file_paths)
+            matched |= paths
+
+        file_paths = list(file_paths)
+        absolute = [os.path.abspath(p) for p in file_paths]
+        unknown = [p for p in absolute if p not in matched]
+        indexed = {}
+        for i in range(0, len(unknown), 900):
+            chunk = unknown[i:i + 900]
+            indexed.update((row[0], row[1:]) for row in self.conn.execute(
+                f"SELECT path, size, mtime_ns, inode FROM files "
+                f"WHERE path IN ({','.join('?' * len(chunk))})", chunk))
+        return [p for p, a in zip(file_paths, absolute)
+                if a in matched or a not in indexed or self._changed(a, indexed[a])]
+
+    @staticmethod
+    def _changed(path, row):
+        """文件在上次刷新后是否被修改（大小、修改时间或 inode 不同），无法读取状态时视为已修改"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return True
+        return (st.st_size, st.st_mtime_ns, st.st_ino) != row
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="文件夹三元组内容索引")
+    parser.add_argument('folder')
+    parser.add_argument('--index', help="索引文件路径")
+    parser.add_argument('--refresh', action='store_true', help="增量刷新索引")
+    parser.add_argument('--compact', action='store_true', help="合并索引分段")
+    parser.add_argument('--search', help="列出可能包含该内容的文件")
+    parser.add_argument('--regex', action='store_true', help="查找内容为正则表达式")
+    args = parser.parse_args(argv)
+
+    with TrigramIndex(args.folder, args.index) as index:
+        if args.refresh:
+            stats = index.refresh()
+            print(f"索引完成: 新索引 {stats['indexed']}，未变化 {stats['unchanged']}，"
+                  f"无法索引 {stats['skipped']}，已删除 {stats['removed']}")
+        if args.compact:
+            index.compact()
+        if args.search:
+            paths = index.search(args.search, args.regex)
+            if paths is None:
+                print("查找内容过短或无法从正则中提取字面量，无法使用索引筛选")
+            else:
+                for path in sorted(paths):
+                    print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())